@@ -0,0 +1,110 @@
+"""
+Cron giriş noktasının soğuk başlangıç benchmark'ı.
+
+Replay sunucusunu boş bir Directus ile başlatır ve main.py'yi ayrı süreçlerde
+defalarca çalıştırır: işlenecek mağaza olmadığında (çoğu dakika) geçen süre
+ve bu sırada yüklenmiş ağır modüller raporlanır. Karşılaştırma için boş
+yorumlayıcı ile import pipeline'ının ve parser'ların import süreleri de ölçülür.
+
+Kullanım (python-service dizininden):
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --max-overhead-ms 100
+
+Süreler makineye bağlı olduğundan sınır, boş yorumlayıcının üzerine eklenen
+süreye uygulanır.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.fixture_server import serve
+from benchmarks.run_benchmark import _free_port, _wait_for_server
+
+# Boş çalışmada yüklenmemesi gereken modüller
+HEAVY_MODULES = ['py_directus', 'pydantic', 'httpx', 'aiohttp', 'redis', 'cloudscraper', 'requests',
+                 'bs4', 'fake_useragent', 'pyinstrument', 'asyncio']
+
+CASES = {
+    'python (boş)': ['-c', 'pass'],
+    'main.py (iş yok)': ['main.py'],
+    'import store_import': ['-c', 'import store_import'],
+    'import parsers.trendyol': ['-c', 'import parsers.trendyol'],
+    'import parsers.hepsiburada': ['-c', 'import parsers.hepsiburada'],
+}
+
+
+def _timed_run(args: List[str], env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def loaded_heavy_modules(env: Dict[str, str]) -> List[str]:
+    """main.py boş çalışmasının sonunda sys.modules'ta bulunan ağır modüller"""
+    script = (
+        "import runpy, sys, io, contextlib\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    runpy.run_path('main.py', run_name='__main__')\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', script], env=env, check=True, capture_output=True, text=True).stdout
+    return [module for module in output.strip().split(',') if module]
+
+
+def run_benchmark(runs: int) -> Dict:
+    ctx = multiprocessing.get_context('spawn')
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Sunucuda hiç mağaza yok, main.py "iş yok" yolundan çıkar
+    server = ctx.Process(target=serve, args=('127.0.0.1', port, 'small'), daemon=True)
+    server.start()
+    try:
+        _wait_for_server(base_url)
+        env = {**os.environ, 'DIRECTUS_API_URL': base_url, 'DIRECTUS_API_TOKEN': 'bench-token'}
+        results = {}
+        for name, args in CASES.items():
+            # İlk çalışma .pyc üretir ve disk cache'ini ısıtır
+            _timed_run(args, env)
+            timings = [_timed_run(args, env) for _ in range(runs)]
+            results[name] = {'median_ms': statistics.median(timings) * 1000, 'min_ms': min(timings) * 1000}
+        heavy = loaded_heavy_modules(env)
+    finally:
+        server.terminate()
+        server.join()
+
+    return {'runs': runs, 'results': results, 'heavy_modules_loaded': heavy}
+
+
+def print_report(report: Dict) -> None:
+    baseline = report['results']['python (boş)']['median_ms']
+    header = f"{'çalışma':<28} {'medyan_ms':>10} {'min_ms':>8} {'ek_ms':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in report['results'].items():
+        print(f"{name:<28} {r['median_ms']:>10.1f} {r['min_ms']:>8.1f} {r['median_ms'] - baseline:>8.1f}")
+    print(f"Boş çalışmada yüklenen ağır modüller: {', '.join(report['heavy_modules_loaded']) or 'yok'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="main.py soğuk başlangıç benchmark'ı")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-overhead-ms', type=float,
+                        help="main.py boş çalışması yorumlayıcının başlangıcına bundan fazla eklerse hata ver")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.runs)
+    print_report(report)
+
+    if report['heavy_modules_loaded']:
+        sys.exit(1)
+    results = report['results']
+    overhead = results['main.py (iş yok)']['median_ms'] - results['python (boş)']['median_ms']
+    if args.max_overhead_ms is not None and overhead > args.max_overhead_ms:
+        print(f"main.py boş çalışması {overhead:.0f} ms ekliyor, sınır {args.max_overhead_ms:.0f} ms")
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Yorum dönüşüm aşaması için mikro benchmark (ağ ve Directus yok).
+
+Kullanım (python-service dizininden):
+    python -m benchmarks.bench_transform --reviews 100000
+"""
+import argparse
+import time
+
+import review_transform
+from benchmarks.synthetic import SyntheticStore
+from parsers import hepsiburada, trendyol
+
+STORE_DATA = {'id': 1, 'user': 'bench-user'}
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_trendyol(store: SyntheticStore, page_size: int, repeat: int) -> float:
+    pages = [store.trendyol_reviews_page(p, page_size)['productReviews']['content']
+             for p in range(max(1, store.review_count // page_size))]
+    product_ids = {str(store.trendyol_product(i)['productContentId']): i + 1 for i in range(store.product_count)}
+
+    def run():
+        for page in pages:
+            trendyol.transform_reviews_for_directus(page, product_ids, STORE_DATA)
+
+    return _timed(run, repeat) / sum(len(p) for p in pages)
+
+
+def bench_hepsiburada(store: SyntheticStore, repeat: int) -> float:
+    per_product = max(1, store.review_count // store.product_count)
+    pages = [store.hepsiburada_reviews(store.hepsiburada_sku(i), 0, 100)['data']['approvedUserContent']['approvedUserContentList']
+             for i in range(store.product_count)]
+
+    def run():
+        for index, page in enumerate(pages):
+            hepsiburada.transform_reviews_for_directus(page, index + 1, STORE_DATA['id'], STORE_DATA)
+
+    return _timed(run, repeat) / (per_product * store.product_count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yorum dönüşümü mikro benchmark")
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-numpy', action='store_true', help="Saf Python yolunu ölç")
+    args = parser.parse_args()
+
+    if args.no_numpy:
+        review_transform.USE_NUMPY = False
+
+    store = SyntheticStore(args.products, args.reviews)
+    print(f"NumPy: {'açık' if review_transform.USE_NUMPY else 'kapalı'}")
+    print(f"trendyol:    {bench_trendyol(store, args.page_size, args.repeat) * 1e6:.2f} µs/yorum")
+    print(f"hepsiburada: {bench_hepsiburada(store, args.repeat) * 1e6:.2f} µs/yorum")
@@ -0,0 +1,368 @@
+"""
+Benchmark için yerel replay sunucusu.
+
+Tek bir aiohttp uygulaması hem Trendyol/Hepsiburada uçlarını (kayıtlı
+fixture dosyalarından ya da sentetik mağazadan) hem de py_directus'un
+kullandığı Directus REST uçlarının sahte bir kopyasını sunar.
+
+Kayıtlı fixture dizini yapısı (hepsi opsiyonel):
+    trendyol/products/<page>.json
+    trendyol/reviews/<page>.json
+    hepsiburada/store/<page>.html
+    hepsiburada/reviews/<sku>_<from>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.synthetic import SCALES, SyntheticStore
+
+# Directus, limit verilmediğinde 100 kayıt döner
+DIRECTUS_DEFAULT_LIMIT = 100
+
+
+class RecordedFixtures:
+    def __init__(self, root: Optional[str]):
+        self.root = root
+
+    def read(self, *parts: str) -> Optional[bytes]:
+        if not self.root:
+            return None
+        path = os.path.join(self.root, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def _loose_eq(a: Any, b: Any) -> bool:
+    return a == b or str(a) == str(b)
+
+
+def _match(item: Dict, flt: Dict) -> bool:
+    for key, condition in flt.items():
+        if key == '_and':
+            if not all(_match(item, sub) for sub in condition):
+                return False
+            continue
+        if key == '_or':
+            if not any(_match(item, sub) for sub in condition):
+                return False
+            continue
+        value = item.get(key)
+        for op, expected in condition.items():
+            if op == '_eq' and not _loose_eq(value, expected):
+                return False
+            if op == '_neq' and _loose_eq(value, expected):
+                return False
+            if op == '_in' and not any(_loose_eq(value, e) for e in expected):
+                return False
+            if op == '_nin' and any(_loose_eq(value, e) for e in expected):
+                return False
+            if op == '_null' and (value is None) != bool(expected):
+                return False
+            if op in ('_gt', '_gte', '_lt', '_lte'):
+                if value is None:
+                    return False
+                try:
+                    left, right = float(value), float(expected)
+                except (TypeError, ValueError):
+                    left, right = str(value), str(expected)
+                if op == '_gt' and not left > right:
+                    return False
+                if op == '_gte' and not left >= right:
+                    return False
+                if op == '_lt' and not left < right:
+                    return False
+                if op == '_lte' and not left <= right:
+                    return False
+    return True
+
+
+def _index_candidates(flt: Dict) -> Optional[tuple]:
+    """Filtrede indekslenebilir bir _eq/_in koşulu varsa (alan, değerler) döner"""
+    for key, condition in flt.items():
+        if key == '_and':
+            for sub in condition:
+                found = _index_candidates(sub)
+                if found:
+                    return found
+            continue
+        if key == '_or':
+            continue
+        if '_eq' in condition:
+            return key, [condition['_eq']]
+        if '_in' in condition:
+            return key, list(condition['_in'])
+    return None
+
+
+# Hata enjeksiyonunun uygulandığı koleksiyonlar (seed ve durum güncellemeleri etkilenmez)
+FAULTY_COLLECTIONS = ('products', 'reviews')
+
+
+class FakeDirectus:
+    """py_directus'un kullandığı uçların bellek içi karşılığı"""
+
+    def __init__(self, latency_ms: float = 0, write_error_rate: float = 0):
+        self.latency = latency_ms / 1000.0
+        # Ürün/yorum yazmalarının bu oranı 503 ile reddedilir (retry/circuit breaker denemesi için)
+        self.write_error_rate = write_error_rate
+        self.reset()
+
+    def write_fails(self, collection: str) -> bool:
+        return collection in FAULTY_COLLECTIONS and random.random() < self.write_error_rate
+
+    def reset(self) -> None:
+        self.collections: Dict[str, Dict[Any, Dict]] = {}
+        self.next_ids: Dict[str, int] = {}
+        # collection -> field -> str(value) -> set(id)
+        self.indexes: Dict[str, Dict[str, Dict[str, set]]] = {}
+
+    def _items(self, collection: str) -> Dict[Any, Dict]:
+        return self.collections.setdefault(collection, {})
+
+    def _index(self, collection: str, field: str) -> Dict[str, set]:
+        by_field = self.indexes.setdefault(collection, {})
+        if field not in by_field:
+            index: Dict[str, set] = {}
+            for item_id, item in self._items(collection).items():
+                index.setdefault(str(item.get(field)), set()).add(item_id)
+            by_field[field] = index
+        return by_field[field]
+
+    def _reindex(self, collection: str, item_id: Any, old: Optional[Dict], new: Dict) -> None:
+        for field, index in self.indexes.get(collection, {}).items():
+            if old is not None:
+                index.get(str(old.get(field)), set()).discard(item_id)
+            index.setdefault(str(new.get(field)), set()).add(item_id)
+
+    def query(self, collection: str, query: Dict) -> List[Dict]:
+        flt = query.get('filter') or {}
+        if isinstance(flt, str):
+            flt = json.loads(flt)
+        items = self._items(collection)
+
+        candidates = _index_candidates(flt) if flt else None
+        if candidates:
+            field, values = candidates
+            index = self._index(collection, field)
+            ids = set()
+            for value in values:
+                ids |= index.get(str(value), set())
+            rows = [items[i] for i in sorted(ids, key=str)]
+        else:
+            rows = list(items.values())
+        if flt:
+            rows = [row for row in rows if _match(row, flt)]
+
+        aggregate = query.get('aggregate')
+        if isinstance(aggregate, str):
+            aggregate = json.loads(aggregate)
+        if aggregate:
+            return [{op: len(rows) for op in aggregate}]
+
+        for sort_key in reversed(query.get('sort') or []):
+            desc = sort_key.startswith('-')
+            field = sort_key.lstrip('-')
+            rows.sort(key=lambda row: (row.get(field) is None, row.get(field)), reverse=desc)
+
+        offset = int(query.get('offset') or 0)
+        limit = int(query.get('limit') or DIRECTUS_DEFAULT_LIMIT)
+        rows = rows[offset:] if limit == -1 else rows[offset:offset + limit]
+
+        fields = query.get('fields')
+        if fields and fields != '*':
+            wanted = fields.split(',') if isinstance(fields, str) else fields
+            rows = [{f: row.get(f) for f in wanted} for row in rows]
+        return rows
+
+    def create(self, collection: str, payload: Dict) -> Dict:
+        items = self._items(collection)
+        item = dict(payload)
+        if 'id' not in item:
+            self.next_ids[collection] = self.next_ids.get(collection, 0) + 1
+            item['id'] = self.next_ids[collection]
+        items[item['id']] = item
+        self._reindex(collection, item['id'], None, item)
+        return item
+
+    def update(self, collection: str, item_id: Any, payload: Dict) -> Optional[Dict]:
+        items = self._items(collection)
+        key = self._resolve_id(items, item_id)
+        if key is None:
+            return None
+        old = items[key]
+        new = {**old, **payload}
+        items[key] = new
+        self._reindex(collection, key, old, new)
+        return new
+
+    @staticmethod
+    def _resolve_id(items: Dict, item_id: Any) -> Any:
+        if item_id in items:
+            return item_id
+        for key in items:
+            if str(key) == str(item_id):
+                return key
+        return None
+
+
+def _collection_from_path(request: web.Request) -> str:
+    if request.match_info.get('users'):
+        return 'directus_users'
+    return request.match_info['collection']
+
+
+def create_app(store: SyntheticStore, fixtures: RecordedFixtures, directus: FakeDirectus) -> web.Application:
+    counters: Counter = Counter()
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app['counters'] = counters
+    app['directus'] = directus
+
+    # --- Trendyol ---
+
+    async def trendyol_products(request: web.Request) -> web.Response:
+        counters['trendyol.products'] += 1
+        page = int(request.query.get('page', 0))
+        size = int(request.query.get('size', 50))
+        recorded = fixtures.read('trendyol', 'products', f"{page}.json")
+        if recorded is not None:
+            return web.Response(body=recorded, content_type='application/json')
+        return web.json_response(store.trendyol_products_page(page, size))
+
+    async def trendyol_reviews(request: web.Request) -> web.Response:
+        counters['trendyol.reviews'] += 1
+        page = int(request.query.get('page', 0))
+        size = int(request.query.get('size', 1000))
+        recorded = fixtures.read('trendyol', 'reviews', f"{page}.json")
+        if recorded is not None:
+            return web.Response(body=recorded, content_type='application/json')
+        return web.json_response(store.trendyol_reviews_page(page, size))
+
+    # --- Hepsiburada ---
+
+    async def hepsiburada_store(request: web.Request) -> web.Response:
+        counters['hepsiburada.store'] += 1
+        page = int(request.query.get('sayfa', 1))
+        recorded = fixtures.read('hepsiburada', 'store', f"{page}.html")
+        if recorded is not None:
+            return web.Response(body=recorded, content_type='text/html')
+        return web.Response(text=store.hepsiburada_store_html(page), content_type='text/html')
+
+    async def hepsiburada_reviews(request: web.Request) -> web.Response:
+        counters['hepsiburada.reviews'] += 1
+        sku = request.query['skuList']
+        from_index = int(request.query.get('from', 0))
+        size = int(request.query.get('size', 100))
+        recorded = fixtures.read('hepsiburada', 'reviews', f"{sku}_{from_index}.json")
+        if recorded is not None:
+            return web.Response(body=recorded, content_type='application/json')
+        return web.json_response(store.hepsiburada_reviews(sku, from_index, size))
+
+    # --- Directus ---
+
+    async def directus_read(request: web.Request) -> web.Response:
+        counters['directus.read'] += 1
+        await asyncio.sleep(directus.latency)
+        collection = _collection_from_path(request)
+        if request.method == 'SEARCH':
+            body = await request.json()
+            query = body.get('query') or {}
+        else:
+            query = dict(request.query)
+            if 'sort' in query:
+                query['sort'] = query['sort'].split(',')
+        return web.json_response({'data': directus.query(collection, query)})
+
+    async def directus_create(request: web.Request) -> web.Response:
+        counters['directus.create'] += 1
+        await asyncio.sleep(directus.latency)
+        collection = _collection_from_path(request)
+        if directus.write_fails(collection):
+            counters['directus.write_errors'] += 1
+            return web.json_response({'errors': [{'message': 'Service Unavailable'}]}, status=503)
+        payload = await request.json()
+        if isinstance(payload, list):
+            counters['directus.items_written'] += len(payload)
+            return web.json_response({'data': [directus.create(collection, item) for item in payload]})
+        counters['directus.items_written'] += 1
+        return web.json_response({'data': directus.create(collection, payload)})
+
+    async def directus_update(request: web.Request) -> web.Response:
+        counters['directus.update'] += 1
+        await asyncio.sleep(directus.latency)
+        collection = _collection_from_path(request)
+        if directus.write_fails(collection):
+            counters['directus.write_errors'] += 1
+            return web.json_response({'errors': [{'message': 'Service Unavailable'}]}, status=503)
+        payload = await request.json()
+        item_id = request.match_info.get('item_id')
+        if item_id is None:
+            # Toplu güncelleme: {"keys": [...], "data": {...} | [...]}
+            keys, data = payload['keys'], payload['data']
+            rows = data if isinstance(data, list) else [data] * len(keys)
+            counters['directus.items_written'] += len(keys)
+            updated = [directus.update(collection, key, row) for key, row in zip(keys, rows)]
+            return web.json_response({'data': [row for row in updated if row is not None]})
+        counters['directus.items_written'] += 1
+        updated = directus.update(collection, item_id, payload)
+        if updated is None:
+            return web.json_response({'errors': [{'message': 'Item not found'}]}, status=404)
+        return web.json_response({'data': updated})
+
+    async def directus_clear_cache(request: web.Request) -> web.Response:
+        counters['directus.cache_clear'] += 1
+        return web.Response(status=204)
+
+    # --- Benchmark kontrol uçları ---
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(dict(counters))
+
+    async def reset(request: web.Request) -> web.Response:
+        counters.clear()
+        directus.reset()
+        return web.json_response({'ok': True})
+
+    app.router.add_get('/sapigw/suppliers/{store_id}/products', trendyol_products)
+    app.router.add_get('/discovery-sellerstore-webgw-service/v1/ugc/product-reviews/reviews/{store_id}', trendyol_reviews)
+    app.router.add_get('/magaza/{slug}', hepsiburada_store)
+    app.router.add_get('/queryapi/v2/ApprovedUserContents', hepsiburada_reviews)
+
+    app.router.add_post('/utils/cache/clear', directus_clear_cache)
+    for prefix in ('/items/{collection}', '/{users:users}'):
+        app.router.add_route('SEARCH', prefix, directus_read)
+        app.router.add_get(prefix, directus_read)
+        app.router.add_post(prefix, directus_create)
+        app.router.add_patch(prefix, directus_update)
+        app.router.add_patch(prefix + '/{item_id}', directus_update)
+
+    app.router.add_get('/__stats', stats)
+    app.router.add_post('/__reset', reset)
+    return app
+
+
+def serve(host: str, port: int, scale: str, fixtures_dir: Optional[str] = None, directus_latency_ms: float = 0,
+          directus_error_rate: float = 0) -> None:
+    store = SyntheticStore.from_scale(scale)
+    app = create_app(store, RecordedFixtures(fixtures_dir), FakeDirectus(directus_latency_ms, directus_error_rate))
+    web.run_app(app, host=host, port=port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Marketplace ve Directus replay sunucusu")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--fixtures', help="Kayıtlı sayfaların bulunduğu dizin")
+    parser.add_argument('--directus-latency-ms', type=float, default=0)
+    parser.add_argument('--directus-error-rate', type=float, default=0, help="503 dönecek yazma oranı (0-1)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.scale, args.fixtures, args.directus_latency_ms, args.directus_error_rate)
@@ -0,0 +1,227 @@
+"""
+Import pipeline için offline benchmark.
+
+Replay sunucusunu ayrı bir süreçte başlatır, her marketplace için
+parse_store'u ayrı bir süreçte çalıştırır ve süre, istek sayıları,
+peak RSS ve saniyedeki yazma sayısını raporlar.
+
+Kullanım (python-service dizininden):
+    python -m benchmarks.run_benchmark --scale small
+    python -m benchmarks.run_benchmark --scale large --json out.json
+    python -m benchmarks.run_benchmark --baseline out.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+from benchmarks.fixture_server import serve
+from benchmarks.synthetic import SCALES
+import metrics
+
+MARKETPLACES = ['trendyol', 'hepsiburada']
+BENCH_USER_ID = 'bench-user'
+BENCH_PACKAGE_ID = 1
+# Regresyon kontrolünde karşılaştırılan metrikler (yüksek = kötü)
+REGRESSION_METRICS = ['wall_s', 'peak_rss_mb', 'upstream_requests', 'directus_requests']
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _http(method: str, url: str, payload=None) -> Dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read() or b'{}')
+
+
+def _wait_for_server(base_url: str, timeout: float = 15) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _http('GET', f"{base_url}/__stats")
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Replay sunucusu başlatılamadı")
+
+
+def _store_record(marketplace: str, base_url: str) -> Dict:
+    if marketplace == 'trendyol':
+        api_connect_info = {'store_id': '1005260', 'token_key': 'bench-token'}
+    else:
+        api_connect_info = {'store_url': f"{base_url}/magaza/bench-store"}
+    return {
+        'id': MARKETPLACES.index(marketplace) + 1,
+        'name': f"bench-{marketplace}",
+        'user': BENCH_USER_ID,
+        'store_type': marketplace,
+        'api_connect_info': api_connect_info,
+        'import_status': 'fetching_store_reviews',
+    }
+
+
+def _seed_directus(base_url: str, store: Dict) -> None:
+    _http('POST', f"{base_url}/__reset")
+    _http('POST', f"{base_url}/users", {'id': BENCH_USER_ID, 'package_id': BENCH_PACKAGE_ID})
+    _http('POST', f"{base_url}/items/packages", {
+        'id': BENCH_PACKAGE_ID,
+        'product_limit': 10 ** 9,
+        'review_limit': 10 ** 9,
+    })
+    _http('POST', f"{base_url}/items/stores", store)
+
+
+def _run_marketplace(marketplace: str, env: Dict[str, str], store: Dict, queue) -> None:
+    """Alt süreçte çalışır; peak RSS yalnızca bu import'u ölçer"""
+    os.environ.update(env)
+    parser_module = importlib.import_module(f'parsers.{marketplace}')
+
+    start = time.perf_counter()
+    try:
+        result = asyncio.run(parser_module.parse_store(store))
+    except Exception as e:
+        print(f"parse_store hata verdi: {str(e)}")
+        result = False
+    wall = time.perf_counter() - start
+
+    # Yazma penceresinin son hali (write_scheduler gauge'ları)
+    write_window = metrics.snapshot()['gauges']
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({'wall_s': wall, 'peak_rss_mb': peak_rss_kb / 1024.0, 'ok': bool(result), 'write_window': write_window})
+
+
+def run_benchmark(scale: str, marketplaces: List[str], fixtures_dir: str = None, directus_latency_ms: float = 0,
+                  directus_error_rate: float = 0) -> Dict:
+    ctx = multiprocessing.get_context('spawn')
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    server = ctx.Process(target=serve, args=('127.0.0.1', port, scale, fixtures_dir, directus_latency_ms, directus_error_rate), daemon=True)
+    server.start()
+    results = {}
+    # Checkpoint ve fetch cache her çalışmada boş başlamalı
+    state_dir = tempfile.mkdtemp(prefix='review-bench-')
+    try:
+        _wait_for_server(base_url)
+        env = {
+            'CHECKPOINT_DIR': os.path.join(state_dir, 'checkpoints'),
+            'FETCH_CACHE_DIR': os.path.join(state_dir, 'fetch_cache'),
+            'DEAD_LETTER_DIR': os.path.join(state_dir, 'dead_letter'),
+            'DIRECTUS_API_URL': base_url,
+            'DIRECTUS_API_TOKEN': 'bench-token',
+            'TRENDYOL_API_URL': base_url,
+            'TRENDYOL_REVIEWS_API_URL': base_url,
+            'HEPSIBURADA_REVIEWS_API_URL': base_url,
+            'HEPSIBURADA_REQUEST_DELAY': '0',
+            'TRENDYOL_REQUEST_DELAY': '0',
+        }
+        for marketplace in marketplaces:
+            store = _store_record(marketplace, base_url)
+            _seed_directus(base_url, store)
+
+            queue = ctx.Queue()
+            worker = ctx.Process(target=_run_marketplace, args=(marketplace, env, store, queue))
+            worker.start()
+            measured = queue.get()
+            worker.join()
+
+            stats = _http('GET', f"{base_url}/__stats")
+            upstream = sum(v for k, v in stats.items() if k.startswith(marketplace + '.'))
+            writes = stats.get('directus.create', 0) + stats.get('directus.update', 0)
+            wall = measured['wall_s']
+            results[marketplace] = {
+                **measured,
+                'upstream_requests': upstream,
+                'directus_reads': stats.get('directus.read', 0),
+                'directus_writes': writes,
+                'directus_requests': stats.get('directus.read', 0) + writes,
+                'items_written': stats.get('directus.items_written', 0),
+                'writes_per_s': writes / wall if wall else 0.0,
+                'items_per_s': stats.get('directus.items_written', 0) / wall if wall else 0.0,
+                'counters': stats,
+            }
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    return {
+        'scale': scale,
+        'directus_latency_ms': directus_latency_ms,
+        'directus_error_rate': directus_error_rate,
+        'results': results,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"Scale: {report['scale']} {SCALES[report['scale']]}, Directus latency: {report['directus_latency_ms']} ms")
+    header = f"{'marketplace':<12} {'wall_s':>9} {'upstream':>9} {'dx_reads':>9} {'dx_writes':>9} {'items':>9} {'writes/s':>9} {'rss_mb':>8}"
+    print(header)
+    print('-' * len(header))
+    for marketplace, r in report['results'].items():
+        print(
+            f"{marketplace:<12} {r['wall_s']:>9.2f} {r['upstream_requests']:>9} {r['directus_reads']:>9} "
+            f"{r['directus_writes']:>9} {r['items_written']:>9} {r['writes_per_s']:>9.1f} {r['peak_rss_mb']:>8.1f}"
+        )
+
+
+def find_regressions(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    regressions = []
+    for marketplace, current in report['results'].items():
+        previous = baseline.get('results', {}).get(marketplace)
+        if not previous:
+            continue
+        for metric in REGRESSION_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            if new > old * (1 + max_regression):
+                regressions.append(f"{marketplace}.{metric}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import pipeline offline benchmark")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--marketplace', nargs='+', choices=MARKETPLACES, default=MARKETPLACES)
+    parser.add_argument('--fixtures', help="Kayıtlı sayfaların bulunduğu dizin")
+    parser.add_argument('--directus-latency-ms', type=float, default=2)
+    parser.add_argument('--directus-error-rate', type=float, default=0, help="503 dönecek Directus yazma oranı (0-1)")
+    parser.add_argument('--json', help="Raporu bu dosyaya yaz")
+    parser.add_argument('--baseline', help="Karşılaştırma yapılacak önceki rapor")
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.scale, args.marketplace, args.fixtures, args.directus_latency_ms, args.directus_error_rate)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.max_regression)
+        if regressions:
+            print("Regresyon tespit edildi:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("Regresyon yok.")
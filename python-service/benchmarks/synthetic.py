@@ -0,0 +1,196 @@
+"""
+Benchmark için deterministik sentetik mağaza verisi.
+
+Tüm sayfalar index'ten hesaplanır, yani 200k yorumluk bir mağaza bile
+bellekte tutulmadan sayfa sayfa üretilebilir.
+"""
+import json
+import math
+from typing import Dict, List
+
+SCALES = {
+    'small': {'products': 200, 'reviews': 2000},
+    'medium': {'products': 2000, 'reviews': 40000},
+    'large': {'products': 10000, 'reviews': 200000},
+}
+
+# 2023-11-14, sabit başlangıç zamanı (ms)
+BASE_TIMESTAMP_MS = 1700000000000
+HEPSIBURADA_PAGE_SIZE = 24
+PRODUCT_ID_OFFSET = 100000
+
+COMMENTS = [
+    "Ürün çok güzel, hızlı kargo için teşekkürler.",
+    "Fiyatına göre idare eder.",
+    "Beklediğim gibi değildi, iade ettim.",
+    "Kalitesi harika, herkese tavsiye ederim.",
+    "Paketleme özensizdi ama ürün sağlam geldi.",
+]
+
+
+class SyntheticStore:
+    def __init__(self, product_count: int, review_count: int):
+        self.product_count = product_count
+        self.review_count = review_count
+
+    @classmethod
+    def from_scale(cls, scale: str) -> 'SyntheticStore':
+        config = SCALES[scale]
+        return cls(config['products'], config['reviews'])
+
+    # --- Trendyol ---
+
+    def trendyol_product(self, index: int) -> Dict:
+        content_id = PRODUCT_ID_OFFSET + index
+        return {
+            'id': f"tp{index:08d}",
+            'productContentId': content_id,
+            'productCode': content_id,
+            'productMainId': f"MAIN-{index:06d}",
+            'stockCode': f"STK-{index:06d}",
+            'barcode': f"869{index:010d}",
+            'title': f"Sentetik Ürün {index}",
+            'description': f"Sentetik ürün açıklaması {index}. " * 8,
+            'brand': 'Bench',
+            'brandId': 1000 + index % 50,
+            'categoryName': f"Kategori {index % 30}",
+            'pimCategoryId': 400 + index % 30,
+            'listPrice': 150.0 + index % 500,
+            'salePrice': 120.0 + index % 500,
+            'quantity': index % 97,
+            'vatRate': 20,
+            'approved': True,
+            'archived': False,
+            'onSale': True,
+            'productUrl': f"https://www.trendyol.com/bench/urun-p-{content_id}",
+            'images': [{'url': f"https://cdn.example.com/{content_id}/{n}.jpg"} for n in range(3)],
+            'attributes': [{'attributeName': 'Renk', 'attributeValue': 'Siyah'}],
+            'createDateTime': BASE_TIMESTAMP_MS - index * 1000,
+            'lastUpdateDate': BASE_TIMESTAMP_MS,
+        }
+
+    def trendyol_products_page(self, page: int, size: int) -> Dict:
+        start = page * size
+        end = min(start + size, self.product_count)
+        return {
+            'page': page,
+            'size': size,
+            'totalElements': self.product_count,
+            'totalPages': max(1, math.ceil(self.product_count / size)),
+            'content': [self.trendyol_product(i) for i in range(start, end)],
+        }
+
+    def trendyol_review(self, index: int) -> Dict:
+        rate = 1 + (index * 7) % 5
+        return {
+            'id': 5000000 + index,
+            'contentId': PRODUCT_ID_OFFSET + index % self.product_count,
+            'comment': COMMENTS[index % len(COMMENTS)],
+            'rate': rate,
+            'userFullName': f"K*** {index % 1000}",
+            'trusted': True,
+            'createdDate': BASE_TIMESTAMP_MS - index * 60000,
+            'lastModifiedDate': BASE_TIMESTAMP_MS - index * 60000,
+            'productName': f"Sentetik Ürün {index % self.product_count}",
+            'imageUrl': f"https://cdn.example.com/{PRODUCT_ID_OFFSET + index % self.product_count}/0.jpg",
+            'sellerName': 'Bench Store',
+            'mediaFiles': [],
+        }
+
+    def trendyol_reviews_page(self, page: int, size: int) -> Dict:
+        start = page * size
+        end = min(start + size, self.review_count)
+        return {
+            'productReviews': {
+                'page': page,
+                'size': size,
+                'totalElements': self.review_count,
+                'totalPages': max(1, math.ceil(self.review_count / size)),
+                'content': [self.trendyol_review(i) for i in range(start, end)],
+            }
+        }
+
+    # --- Hepsiburada ---
+
+    def hepsiburada_sku(self, index: int) -> str:
+        return f"HBC{index:08d}"
+
+    def hepsiburada_product(self, index: int) -> Dict:
+        return {
+            'productId': f"HBV{index:08d}",
+            'sku': self.hepsiburada_sku(index),
+            'name': f"Sentetik Ürün {index}",
+            'price': [{'value': 99.9 + index % 300, 'currency': 'TRY'}],
+            'categoryName': f"Kategori {index % 30}",
+            'categoryId': 60000 + index % 30,
+            'images': [{'linkFormat': f"https://productimages.example.com/{index}/{{size}}/{n}.jpg"} for n in range(3)],
+            'productUrl': f"/sentetik-urun-{index}-p-HBC{index:08d}",
+            'brandName': 'Bench',
+            'rating': 1 + (index % 5),
+            'merchantId': 'bench-merchant-id',
+            'merchantName': 'Bench Store',
+            'variantList': [],
+        }
+
+    def hepsiburada_page_count(self) -> int:
+        return max(1, math.ceil(self.product_count / HEPSIBURADA_PAGE_SIZE))
+
+    def hepsiburada_redux_state(self, page: int) -> Dict:
+        start = (page - 1) * HEPSIBURADA_PAGE_SIZE
+        end = min(start + HEPSIBURADA_PAGE_SIZE, self.product_count)
+        return {
+            'merchantState': {
+                'merchantDetail': {
+                    'name': 'Bench Store',
+                    'brandName': 'Bench',
+                    'legalName': 'Bench Ticaret A.Ş.',
+                    'phoneNumber': '0850 000 00 00',
+                    'kep': 'bench@hs01.kep.tr',
+                    'mersisNumber': '0000000000000000',
+                    'city': 'İstanbul',
+                    'ratingSummary': {'lifetimeRating': 9.4, 'ratingQuantity': self.review_count},
+                    'tagList': ['fast-shipping'],
+                },
+                'merchantSearch': {
+                    'totalProductCount': self.product_count,
+                    'products': [self.hepsiburada_product(i) for i in range(max(start, 0), end)],
+                },
+            },
+            # Gerçek sayfadaki redux ağacının geri kalanını temsil eden dolgu
+            'layoutState': {'widgets': [{'id': n, 'html': 'x' * 256} for n in range(200)]},
+        }
+
+    def hepsiburada_store_html(self, page: int) -> str:
+        state = json.dumps(self.hepsiburada_redux_state(page), ensure_ascii=False)
+        return (
+            "<!DOCTYPE html><html><head><title>Bench Store</title></head><body>"
+            + "<div class=\"filler\">" + ("<span>lorem ipsum</span>" * 500) + "</div>"
+            + f"<script id=\"reduxStore\" type=\"application/json\">{state}</script>"
+            + "</body></html>"
+        )
+
+    def _hepsiburada_review_count_for(self, product_index: int) -> int:
+        base, extra = divmod(self.review_count, self.product_count)
+        return base + (1 if product_index < extra else 0)
+
+    def hepsiburada_reviews(self, sku: str, from_index: int, size: int) -> Dict:
+        product_index = int(sku[3:])
+        total = self._hepsiburada_review_count_for(product_index)
+        end = min(from_index + size, total)
+        reviews: List[Dict] = []
+        for k in range(from_index, end):
+            n = product_index * 1000 + k
+            reviews.append({
+                'id': f"hbr-{product_index}-{k}",
+                'review': {'content': COMMENTS[n % len(COMMENTS)]},
+                'star': 1 + (n * 7) % 5,
+                'createdAt': f"2024-{1 + k % 12:02d}-{1 + k % 28:02d}T10:{k % 60:02d}:00+03:00",
+                'customer': {'name': 'K***', 'surname': 'Y***', 'id': f"c{n}"},
+                'isPurchaseVerified': k % 3 != 0,
+                'media': [],
+                'order': {'merchant': 'Bench Store'} if k % 4 else None,
+            })
+        return {
+            'data': {'approvedUserContent': {'approvedUserContentList': reviews}},
+            'links': {'next': f"?from={end}" if end < total else None},
+        }
@@ -0,0 +1,299 @@
+"""
+İlk büyük import'lar için doğrudan PostgreSQL'e toplu yazma (opsiyonel).
+
+IMPORT_SINK=postgres ve BULK_LOAD_DSN verildiğinde parser'lar ürün ve
+yorumları Directus REST yerine Directus'un yönettiği tablolara yazar:
+satırlar COPY ile geçici bir tabloya alınır, oradan tek bir
+INSERT ... ON CONFLICT ile hedef tabloya aktarılır. Çakışma anahtarları
+reviews için review_target_id, products için (store, sku)'dur. Yazma sonrası
+Directus'un cache'i /utils/cache/clear ile temizlenir.
+
+Tablolar Directus'a ait olduğu için çakışma anahtarlarındaki unique index'ler
+kendiliğinden oluşturulmaz; index yoksa Directus API'ye düşülür. Index'ler
+bir kez BULK_LOAD_CREATE_INDEXES=1 ile ya da --create-indexes ile oluşturulur.
+
+asyncpg gerektirir (requirements.txt). Yerel bir Postgres'e karşı kontrol için:
+    BULK_LOAD_DSN=postgresql://postgres:1@localhost:5432/directus_db python bulk_loader.py [--create-indexes]
+"""
+import os
+import sys
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+import json_codec
+from records import ProductRecord, ReviewRecord
+
+try:
+    import asyncpg
+except ImportError:  # asyncpg opsiyonel
+    asyncpg = None
+
+IMPORT_SINK = os.getenv("IMPORT_SINK", "directus").lower()
+BULK_LOAD_DSN = os.getenv("BULK_LOAD_DSN")
+# Çakışma anahtarları için unique index yoksa oluşturulsun mu (Directus tablolarında DDL)
+BULK_LOAD_CREATE_INDEXES = os.getenv("BULK_LOAD_CREATE_INDEXES", "0") == "1"
+
+CONFLICT_KEYS = {
+    'products': ('store', 'sku'),
+    'reviews': ('review_target_id',),
+}
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _to_text(value: Any, column_type: str) -> Optional[str]:
+    """COPY için değeri metne çevirir, hedef tipe dönüşüm INSERT sırasında yapılır"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        # Directus'un csv alanları düz metin kolonlarda virgülle tutulur
+        if isinstance(value, list) and (column_type == 'text' or column_type.startswith('character varying')):
+            return ','.join(str(item) for item in value)
+        return json_codec.dumps_str(value)
+    return str(value)
+
+
+class BulkLoader:
+    def __init__(self, dsn: str, create_indexes: bool = BULK_LOAD_CREATE_INDEXES):
+        self.dsn = dsn
+        self.create_indexes = create_indexes
+        self.conn = None
+        self.dirty = False
+        self._column_types: Dict[str, Dict[str, str]] = {}
+        self._indexed = set()
+        self._skipped_columns = set()
+
+    async def connect(self) -> None:
+        self.conn = await asyncpg.connect(self.dsn)
+
+    async def close(self) -> None:
+        await self.invalidate_directus_cache()
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def column_types(self, table: str) -> Dict[str, str]:
+        if table not in self._column_types:
+            rows = await self.conn.fetch(
+                """
+                SELECT attname, format_type(atttypid, atttypmod) AS column_type
+                FROM pg_attribute
+                WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped
+                """,
+                table
+            )
+            self._column_types[table] = {row['attname']: row['column_type'] for row in rows}
+        return self._column_types[table]
+
+    async def has_conflict_index(self, table: str) -> bool:
+        """Çakışma anahtarlarının tam olarak kapsandığı bir unique index var mı"""
+        return await self.conn.fetchval(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_index i
+                WHERE i.indrelid = to_regclass($1) AND i.indisunique AND i.indpred IS NULL
+                  AND (SELECT array_agg(a.attname::text ORDER BY a.attname)
+                       FROM pg_attribute a
+                       WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey))
+                      = (SELECT array_agg(key ORDER BY key) FROM unnest($2::text[]) AS key)
+            )
+            """,
+            table, list(CONFLICT_KEYS[table])
+        )
+
+    async def ensure_conflict_index(self, table: str) -> None:
+        """ON CONFLICT için çakışma anahtarında unique index olmalı"""
+        if table in self._indexed:
+            return
+        keys = CONFLICT_KEYS[table]
+        if not await self.has_conflict_index(table):
+            if not self.create_indexes:
+                raise RuntimeError(
+                    f"{table} tablosunda ({', '.join(keys)}) için unique index yok; "
+                    f"BULK_LOAD_CREATE_INDEXES=1 ile oluşturulabilir"
+                )
+            index_name = f"{table}_{'_'.join(keys)}_bulk_load_key"
+            await self.conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(index_name)} "
+                f"ON {_quote(table)} ({', '.join(_quote(key) for key in keys)})"
+            )
+        self._indexed.add(table)
+
+    async def upsert(self, table: str, rows: List[Dict], returning: Sequence[str] = ('id',)) -> List[Dict]:
+        """
+        Satırları tabloya ekler veya çakışma anahtarına göre günceller.
+        Aynı anahtar birden fazla geliyorsa son satır geçerli olur.
+        """
+        if not rows:
+            return []
+
+        await self.ensure_conflict_index(table)
+        types = await self.column_types(table)
+        keys = CONFLICT_KEYS[table]
+
+        written = {column for row in rows for column in row}
+        unknown = written - set(types) - self._skipped_columns
+        if unknown:
+            self._skipped_columns |= unknown
+            print(f"Bulk load: {table} tablosunda olmayan alanlar atlandı: {', '.join(sorted(unknown))}")
+        columns = [column for column in types if column in written]
+
+        staging = f"bulk_{table}"
+        records = [
+            (ordinal,) + tuple(_to_text(row.get(column), types[column]) for column in columns)
+            for ordinal, row in enumerate(rows)
+        ]
+
+        insert_columns = list(columns)
+        select_values = [f"{_quote(column)}::{types[column]}" for column in columns]
+        # Directus'un REST üzerinden yazarken kendisinin doldurduğu zaman alanları
+        if 'date_created' in types and 'date_created' not in written:
+            insert_columns.append('date_created')
+            select_values.append('now()')
+        updates = [f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in columns if column not in keys and column != 'id']
+        if 'date_updated' in types and 'date_updated' not in written:
+            updates.append(f"{_quote('date_updated')} = now()")
+
+        conflict = ', '.join(_quote(key) for key in keys)
+        query = (
+            f"INSERT INTO {_quote(table)} ({', '.join(_quote(column) for column in insert_columns)}) "
+            f"SELECT DISTINCT ON ({conflict}) {', '.join(select_values)} FROM {_quote(staging)} "
+            f"ORDER BY {conflict}, _ord DESC "
+            f"ON CONFLICT ({conflict}) DO "
+            + (f"UPDATE SET {', '.join(updates)} " if updates else "NOTHING ")
+            + f"RETURNING {', '.join(_quote(column) for column in returning)}"
+        )
+
+        async with self.conn.transaction():
+            await self.conn.execute(
+                f"CREATE TEMP TABLE {_quote(staging)} (_ord integer, "
+                + ', '.join(f"{_quote(column)} text" for column in columns)
+                + ") ON COMMIT DROP"
+            )
+            await self.conn.copy_records_to_table(staging, records=records, columns=['_ord'] + columns)
+            result = await self.conn.fetch(query)
+
+        self.dirty = True
+        return [dict(row) for row in result]
+
+    async def upsert_products(self, rows: List[ProductRecord]) -> Dict[str, Any]:
+        """sku -> Directus ürün id eşlemesini döner"""
+        result = await self.upsert('products', [row.as_dict() for row in rows], returning=('id', 'sku'))
+        return {str(row['sku']): row['id'] for row in result}
+
+    async def upsert_reviews(self, rows: List[ReviewRecord]) -> int:
+        result = await self.upsert('reviews', [row.as_dict() for row in rows])
+        return len(result)
+
+    async def invalidate_directus_cache(self) -> None:
+        """Tablolar Directus'un dışından değiştiği için cache'i temizletir"""
+        if not self.dirty:
+            return
+        # aiohttp sadece burada gerekiyor, Trendyol import'larında yüklenmesin
+        import aiohttp
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    f"{os.getenv('DIRECTUS_API_URL')}/utils/cache/clear",
+                    headers={'Authorization': f"Bearer {os.getenv('DIRECTUS_API_TOKEN')}"}
+                ) as response:
+                    if response.status >= 400:
+                        print(f"Directus cache temizlenemedi: HTTP {response.status}")
+                        return
+            self.dirty = False
+        except Exception as e:
+            print(f"Directus cache temizlenemedi: {str(e)}")
+
+    async def verify(self) -> List[str]:
+        """Tabloların toplu yazmaya uygunluğunu kontrol eder, sorunları döner"""
+        problems = []
+        for table, keys in CONFLICT_KEYS.items():
+            types = await self.column_types(table)
+            if not types:
+                problems.append(f"{table} tablosu bulunamadı")
+                continue
+            missing = [key for key in keys if key not in types]
+            if missing:
+                problems.append(f"{table} tablosunda çakışma alanları yok: {', '.join(missing)}")
+                continue
+            duplicates = await self.conn.fetchval(
+                f"SELECT count(*) FROM (SELECT 1 FROM {_quote(table)} "
+                f"GROUP BY {', '.join(_quote(key) for key in keys)} HAVING count(*) > 1) AS duplicate_keys"
+            )
+            if duplicates:
+                problems.append(f"{table} tablosunda {duplicates} tekrarlanan anahtar var, unique index oluşturulamaz")
+        return problems
+
+
+_bulk_loader: Optional[BulkLoader] = None
+_bulk_loader_failed = False
+
+
+async def get_bulk_loader() -> Optional[BulkLoader]:
+    """IMPORT_SINK=postgres ise süreç genelinde tek bağlantı, değilse None"""
+    global _bulk_loader, _bulk_loader_failed
+    if IMPORT_SINK != 'postgres' or _bulk_loader_failed:
+        return None
+    if _bulk_loader is None:
+        if asyncpg is None or not BULK_LOAD_DSN:
+            print("Bulk load için asyncpg ve BULK_LOAD_DSN gerekli, Directus API kullanılacak")
+            _bulk_loader_failed = True
+            return None
+        loader = BulkLoader(BULK_LOAD_DSN)
+        try:
+            await loader.connect()
+            # Index eksikse yazma ortasında değil, başta Directus API'ye düşülür
+            for table in CONFLICT_KEYS:
+                await loader.ensure_conflict_index(table)
+        except Exception as e:
+            print(f"Bulk load kullanılamıyor, Directus API kullanılacak: {str(e)}")
+            if loader.conn is not None:
+                await loader.conn.close()
+            _bulk_loader_failed = True
+            return None
+        _bulk_loader = loader
+    return _bulk_loader
+
+
+async def invalidate_directus_cache() -> None:
+    if _bulk_loader is not None:
+        await _bulk_loader.invalidate_directus_cache()
+
+
+async def close_bulk_loader() -> None:
+    global _bulk_loader
+    if _bulk_loader is not None:
+        await _bulk_loader.close()
+        _bulk_loader = None
+
+
+async def _check(dsn: str, create_indexes: bool = False) -> bool:
+    loader = BulkLoader(dsn, create_indexes=create_indexes)
+    await loader.connect()
+    try:
+        problems = await loader.verify()
+        if not problems:
+            for table in CONFLICT_KEYS:
+                try:
+                    await loader.ensure_conflict_index(table)
+                except RuntimeError as e:
+                    problems.append(str(e))
+    finally:
+        await loader.conn.close()
+    for problem in problems:
+        print(problem)
+    if not problems:
+        print("Bulk load için tablolar uygun")
+    return not problems
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    dsn = os.getenv("BULK_LOAD_DSN")
+    if asyncpg is None or not dsn:
+        raise SystemExit("asyncpg kurulu olmalı ve BULK_LOAD_DSN verilmeli")
+    raise SystemExit(0 if asyncio.run(_check(dsn, create_indexes='--create-indexes' in sys.argv)) else 1)
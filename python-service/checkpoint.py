@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Checkpoint dosyalarının tutulduğu dizin (her mağaza için bir JSON dosyası)
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "state/checkpoints")
+# Kaç batch'te bir diske yazılacağı
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "5"))
+# Bu süreden uzun süredir güncellenmeyen checkpoint'in sahibi olan işlem ölmüş kabul edilir
+CHECKPOINT_STALE_SECONDS = int(os.getenv("CHECKPOINT_STALE_SECONDS", "1800"))
+# İlerleme kaydetmeden art arda bu kadar başarısız olan import kalıcı hata sayılır
+# (engellenen IP, değişen sayfa yapısı, yetki hatası vb.)
+IMPORT_MAX_ATTEMPTS = int(os.getenv("IMPORT_MAX_ATTEMPTS", "5"))
+# Denemeler arası bekleme: IMPORT_RETRY_BASE_SECONDS * 2^(deneme-1), en fazla IMPORT_RETRY_MAX_SECONDS
+IMPORT_RETRY_BASE_SECONDS = int(os.getenv("IMPORT_RETRY_BASE_SECONDS", "300"))
+IMPORT_RETRY_MAX_SECONDS = int(os.getenv("IMPORT_RETRY_MAX_SECONDS", "21600"))
+
+INTERRUPTED_STATUS = 'import_interrupted'
+
+
+class ImportCheckpoint:
+    """
+    Bir mağaza import'unun kaldığı yeri tutar.
+
+    Kullanılan anahtarlar:
+        product_page: Sıradaki ürün sayfası
+        products_done: Ürün aşaması tamamlandı mı
+        review_page: Sıradaki yorum sayfası (Trendyol)
+        sku_index: Yorumları tamamlanan ürün sayısı (Hepsiburada)
+        last_product_id: Yorumları tamamlanan son ürünün Directus id'si (Hepsiburada)
+        review_from: Sıradaki ürün için yorum offset'i (Hepsiburada)
+        attempts: İlerleme olmadan art arda başarısız deneme sayısı
+        failed_at: Son başarısız denemenin zamanı
+    """
+
+    def __init__(self, store_id: Any, state: Optional[Dict] = None, save_every: int = CHECKPOINT_EVERY):
+        self.store_id = store_id
+        self.state = state or {}
+        self.save_every = max(1, save_every)
+        self._pending = 0
+
+    @staticmethod
+    def path_for(store_id: Any) -> str:
+        return os.path.join(CHECKPOINT_DIR, f"{store_id}.json")
+
+    @classmethod
+    def load(cls, store_id: Any, quiet: bool = False) -> 'ImportCheckpoint':
+        path = cls.path_for(store_id)
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if not quiet:
+                print(f"Checkpoint bulundu ({store_id}): {state}")
+            return cls(store_id, state)
+        except FileNotFoundError:
+            return cls(store_id)
+        except Exception as e:
+            print(f"Checkpoint okunamadı ({store_id}): {str(e)}")
+            return cls(store_id)
+
+    @classmethod
+    def exists(cls, store_id: Any) -> bool:
+        return os.path.exists(cls.path_for(store_id))
+
+    @classmethod
+    def is_stale(cls, store_id: Any, max_age: int = CHECKPOINT_STALE_SECONDS, updated_at: Optional[str] = None) -> bool:
+        """
+        Checkpoint uzun süredir güncellenmediyse import'un sahibi ölmüştür. İlk
+        checkpoint yazılmadan ölen import'lar için mağazanın Directus'taki
+        son güncellenme zamanına (date_updated) bakılır.
+        """
+        try:
+            return time.time() - os.path.getmtime(cls.path_for(store_id)) > max_age
+        except FileNotFoundError:
+            if not updated_at:
+                return False
+        try:
+            updated = datetime.fromisoformat(updated_at.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return False
+        return time.time() - updated > max_age
+
+    @staticmethod
+    def saved_ids() -> List[str]:
+        """Diskte checkpoint'i olan mağazalar"""
+        try:
+            names = os.listdir(CHECKPOINT_DIR)
+        except FileNotFoundError:
+            return []
+        return [name[:-len(".json")] for name in names if name.endswith(".json")]
+
+    @classmethod
+    def fresh_ids(cls, max_age: int = CHECKPOINT_STALE_SECONDS) -> List[str]:
+        """Checkpoint'i yakın zamanda güncellenen, yani import'u hâlâ çalışan mağazalar"""
+        return [store_id for store_id in cls.saved_ids() if not cls.is_stale(store_id, max_age)]
+
+    @classmethod
+    def abandoned_ids(cls, max_age: int = CHECKPOINT_STALE_SECONDS) -> List[str]:
+        """
+        Checkpoint'i uzun süredir güncellenmeyen ve son kaydı başarısız deneme
+        olmayan mağazalar: import'u checkpoint yazdıktan sonra ölmüş olabilir.
+        Yarıda kalıp bekleyen ya da hataya düşen mağazalar attempts anahtarı taşır.
+        """
+        return [
+            store_id for store_id in cls.saved_ids()
+            if cls.is_stale(store_id, max_age) and 'attempts' not in cls.load(store_id, quiet=True).state
+        ]
+
+    @classmethod
+    def retry_due(cls, store_id: Any) -> bool:
+        """Yarıda kalan import'un tekrar denenme zamanı geldi mi (üstel bekleme)"""
+        return time.time() >= cls.load(store_id, quiet=True).retry_at()
+
+    def retry_at(self) -> float:
+        attempts = self.get('attempts', 0)
+        if not attempts:
+            return 0.0
+        delay = min(IMPORT_RETRY_MAX_SECONDS, IMPORT_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        return self.get('failed_at', 0) + delay
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.state)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(key, default)
+
+    def advance(self, **progress) -> None:
+        """İlerlemeyi kaydeder, her save_every çağrıda bir diske yazar"""
+        self.state.update(progress)
+        # İlerleyen import kalıcı bir hataya takılmamıştır, deneme sayacı sıfırlanır
+        self.state.pop('attempts', None)
+        self._pending += 1
+        if self._pending >= self.save_every:
+            self.save()
+
+    def save(self) -> None:
+        if not self.state:
+            return
+        self.state['updated_at'] = time.time()
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        # Yarım yazılmış dosya kalmaması için önce geçici dosyaya yaz
+        fd, tmp_path = tempfile.mkstemp(dir=CHECKPOINT_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path_for(self.store_id))
+            self._pending = 0
+        except Exception as e:
+            print(f"Checkpoint kaydedilemedi ({self.store_id}): {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def record_failure(self) -> bool:
+        """Başarısız denemeyi kaydeder; tekrar denenecekse True, deneme hakkı bittiyse False döner"""
+        attempts = self.get('attempts', 0) + 1
+        self.state['failed_at'] = time.time()
+        if attempts >= IMPORT_MAX_ATTEMPTS:
+            print(f"Import {attempts} denemede ilerlemedi ({self.store_id}), tekrar denenmeyecek")
+            # İlerleme korunur; mağaza elle tekrar kuyruğa alınırsa sayaç sıfırdan başlar
+            self.state['attempts'] = 0
+            self.save()
+            return False
+        self.state['attempts'] = attempts
+        self.save()
+        print(f"Import yarıda kaldı ({self.store_id}), {attempts}. deneme; "
+              f"en erken {int(self.retry_at() - time.time())} sn sonra devam edilecek")
+        return True
+
+    def clear(self) -> None:
+        self.state = {}
+        self._pending = 0
+        try:
+            os.remove(self.path_for(self.store_id))
+        except FileNotFoundError:
+            pass
+
+
+def failure_status(store_id: Any, default: str = 'error') -> str:
+    """
+    Checkpoint varsa mağaza kaldığı yerden devam edebilir; ilerleme olmadan
+    IMPORT_MAX_ATTEMPTS kez başarısız olduysa default döner
+    """
+    if not ImportCheckpoint.exists(store_id):
+        return default
+    return INTERRUPTED_STATUS if ImportCheckpoint.load(store_id, quiet=True).record_failure() else default
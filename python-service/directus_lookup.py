@@ -0,0 +1,108 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from py_directus import Directus, F
+from directus_writer import read
+from identity_cache import identity_cache, product_key
+from records import Record
+
+# Keyset sayfalamada bir istekte okunacak kayıt sayısı
+STREAM_BATCH_SIZE = 500
+
+
+async def iter_collection(directus: Directus, collection: str, filter: Optional[F] = None,
+                          fields: Sequence[str] = ('id',), batch_size: int = STREAM_BATCH_SIZE,
+                          after_id: Any = None) -> AsyncIterator[Dict]:
+    """
+    Bir koleksiyonu id sırasıyla, sayfa sayfa okur (keyset cursor: id > son id).
+    Directus'un varsayılan limitine takılmadan tüm kayıtlar gelir, bellekte
+    aynı anda en fazla bir sayfa tutulur. Sadece istenen alanlar okunur.
+    """
+    fields = tuple(fields) if 'id' in fields else ('id',) + tuple(fields)
+    last_id = after_id
+
+    while True:
+        query_filter = filter
+        if last_id is not None:
+            cursor = F(id__gt=last_id)
+            query_filter = cursor if filter is None else filter & cursor
+
+        request = directus.collection(collection)
+        if query_filter is not None:
+            request = request.filter(query_filter)
+        response = await read(request.fields(*fields).sort('id').limit(batch_size).read, collection)
+
+        items = response.items or []
+        for item in items:
+            yield item
+
+        if len(items) < batch_size:
+            break
+        last_id = items[-1]['id']
+
+
+async def count_items(directus: Directus, collection: str, filter: Optional[F] = None) -> int:
+    request = directus.collection(collection)
+    if filter is not None:
+        request = request.filter(filter)
+    response = await read(request.aggregate(count="*").read, collection)
+    return int(response.items[0].get('count') or 0) if response.items else 0
+
+
+async def load_product_index(directus: Directus, store_type: str, store_id: Any) -> Dict[str, Any]:
+    """Mağazanın tüm ürünleri için product_id -> Directus id eşlemesi (akış halinde okunur)"""
+    index = {}
+    async for product in iter_collection(
+        directus, 'products', F(store_type=store_type) & F(store=store_id), fields=('id', 'product_id')
+    ):
+        index[str(product['product_id'])] = product['id']
+    return index
+
+
+async def fetch_product_ids(directus: Directus, store_type: str, store_id: Any, product_ids: List[str]) -> Dict[str, Any]:
+    """
+    Marketplace product_id -> Directus ürün id eşlemesi. Önce identity cache'e
+    bakılır, cache'te olmayanlar tek sorguda getirilir.
+    """
+    if not product_ids:
+        return {}
+    keys = {product_key(store_type, store_id, product_id): str(product_id) for product_id in product_ids}
+    cached = await identity_cache.get_many('product', keys)
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = [product_id for key, product_id in keys.items() if key not in cached]
+    if missing:
+        products = await read(directus.collection('products').filter(
+            F(store_type=store_type) & F(store=store_id) & F(product_id__in=missing)
+        ).fields('id', 'product_id').limit(-1).read, 'products')
+        found = {str(product['product_id']): product['id'] for product in products.items or []}
+        await identity_cache.set_many('product', {
+            product_key(store_type, store_id, product_id): value for product_id, value in found.items()
+        })
+        result.update(found)
+    return result
+
+
+async def fetch_existing_review_ids(directus: Directus, review_target_ids: List[str]) -> Dict[str, Any]:
+    """
+    review_target_id -> Directus yorum id eşlemesi. Önce identity cache'e
+    bakılır, cache'te olmayanlar tek sorguda getirilir.
+    """
+    if not review_target_ids:
+        return {}
+    result = await identity_cache.get_many('review', review_target_ids)
+
+    missing = [target_id for target_id in review_target_ids if target_id not in result]
+    if missing:
+        reviews = await read(directus.collection('reviews').filter(
+            F(review_target_id__in=missing)
+        ).fields('id', 'review_target_id').limit(-1).read, 'reviews')
+        found = {review['review_target_id']: review['id'] for review in reviews.items or []}
+        await identity_cache.set_many('review', found)
+        result.update(found)
+    return result
+
+
+async def remember_created(namespace: str, rows: List[Record], key_field: str, created: List[Optional[Dict]]) -> None:
+    """Oluşturulan kayıtların id'lerini identity cache'e ekler (created, rows ile aynı sırada)"""
+    await identity_cache.set_many(namespace, {
+        getattr(row, key_field): item['id'] for row, item in zip(rows, created) if item and 'id' in item
+    })
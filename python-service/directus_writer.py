@@ -0,0 +1,363 @@
+"""
+Directus yazmaları için retry, circuit breaker ve dead-letter kuyruğu.
+Import'un yazmadan önce yaptığı okumalar da read() ile aynı yoldan geçer.
+
+Geçici hatalarda (bağlantı, zaman aşımı, 429/5xx) istek jitter'lı üstel
+beklemeyle tekrarlanır. Üst üste hatalar circuit breaker'ı açar; açıkken
+süreçteki tüm yazmalar Directus düzelene kadar bekler, böylece her kayıt kendi
+başarısız isteğini beklemez. Uzun süren kesintide DirectusUnavailable
+fırlatılır, import checkpoint'ten sonra devam eder.
+
+Tekrar denemelere rağmen yazılamayan kayıtlar DEAD_LETTER_DIR altında
+koleksiyon başına JSONL dosyasına yazılır ve toplu olarak yeniden gönderilir:
+    python directus_writer.py replay
+Replay idempotenttir: sonraki import'un zaten oluşturduğu kayıtlar doğal
+anahtarlarıyla (NATURAL_KEYS) bulunup güncellenir, silinmiş kayıtların
+güncellemeleri atılır.
+"""
+import os
+import sys
+import glob
+import time
+import random
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+from py_directus import Directus, F
+from py_directus.directus_response import DirectusException, DirectusResponse
+import json_codec
+
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "4"))
+WRITE_RETRY_BASE_DELAY = float(os.getenv("WRITE_RETRY_BASE_DELAY", "0.5"))
+WRITE_RETRY_MAX_DELAY = float(os.getenv("WRITE_RETRY_MAX_DELAY", "30"))
+# Art arda kaç geçici hatada devre açılır, açıkken ne kadar beklenir
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "15"))
+# Devre bu kadar süre açık kalırsa import durdurulur
+CIRCUIT_MAX_PAUSE_SECONDS = float(os.getenv("CIRCUIT_MAX_PAUSE_SECONDS", "600"))
+DEAD_LETTER_DIR = os.getenv("DEAD_LETTER_DIR", "state/dead_letter")
+REPLAY_BATCH_SIZE = 100
+# Replay'de eklenecek kaydın zaten var olup olmadığına bakılan alanlar
+# (son alan sorguda _in ile aranır, öncekiler kapsamı belirler)
+NATURAL_KEYS = {
+    'reviews': ('review_target_id',),
+    'products': ('store', 'sku'),
+}
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Her denemenin süresi ve sonucu (başarılı mı) ile çağrılır, bkz. write_scheduler
+WriteObserver = Callable[[float, bool], None]
+
+
+class DirectusUnavailable(Exception):
+    """Directus uzun süredir yazma kabul etmiyor"""
+
+
+class TransientWriteError(Exception):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TransientWriteError, httpx.TransportError)):
+        return True
+    if isinstance(error, DirectusException):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+def describe(error: Exception) -> str:
+    if isinstance(error, DirectusException):
+        return f"HTTP {error.status_code} {error.message or ''}".strip()
+    return str(error) or type(error).__name__
+
+
+class CircuitBreaker:
+    """
+    closed: istekler serbest; open: herkes bekler; half-open: tek bir deneme
+    isteği gönderilir, başarılıysa devre kapanır, değilse yeniden açılır.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS,
+                 max_pause_seconds: float = CIRCUIT_MAX_PAUSE_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_pause_seconds = max_pause_seconds
+        self.failures = 0
+        # opened_at: son açılma/başarısız deneme zamanı, paused_since: ilk açılma zamanı
+        self.opened_at: Optional[float] = None
+        self.paused_since: Optional[float] = None
+        self._probe = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    async def before_call(self) -> bool:
+        """
+        Devre açıksa kapanana kadar bekler; deneme isteği bu çağrıya düştüyse
+        True döner, çağıran iş bitince release_probe() çağırır. Vazgeçmeden önce
+        sırası gelen deneme isteği gönderilir.
+        """
+        while self.is_open:
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_seconds and not self._probe.locked():
+                await self._probe.acquire()
+                return True
+            paused = now - self.paused_since
+            if paused > self.max_pause_seconds:
+                # Devre açık kalır ama süre yeniden başlar; sonraki import'lar
+                # deneme isteğiyle Directus'un düzelip düzelmediğini görebilir
+                self.paused_since = now
+                raise DirectusUnavailable(f"Directus {paused:.0f} sn boyunca istek kabul etmedi")
+            await asyncio.sleep(min(1.0, self.reset_seconds))
+        return False
+
+    def release_probe(self) -> None:
+        self._probe.release()
+
+    def record_success(self) -> None:
+        if self.is_open:
+            print("Directus yeniden istek kabul ediyor, devre kapandı")
+        self.failures = 0
+        self.opened_at = None
+        self.paused_since = None
+
+    def record_failure(self, probe: bool) -> None:
+        self.failures += 1
+        if probe:
+            # Deneme başarısız, bekleme yeniden başlar (toplam duraklama süresi korunur)
+            self.opened_at = time.monotonic()
+        elif not self.is_open and self.failures >= self.failure_threshold:
+            print(f"Directus {self.failures} yazmada üst üste hata verdi, yazmalar duraklatıldı")
+            self.opened_at = self.paused_since = time.monotonic()
+
+
+breaker = CircuitBreaker()
+
+
+def _retry_delay(attempt: int) -> float:
+    # Full jitter: aynı anda hata alan istekler aynı anda tekrar denemez
+    return random.uniform(0, min(WRITE_RETRY_MAX_DELAY, WRITE_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def dead_letter(collection: str, operation: str, data: Any, item_id: Any = None, error: Optional[Exception] = None) -> None:
+    """Yazılamayan kaydı sonradan tekrar gönderilmek üzere diske ekler"""
+    try:
+        os.makedirs(DEAD_LETTER_DIR, exist_ok=True)
+        entry = {
+            'failed_at': time.time(),
+            'collection': collection,
+            'operation': operation,
+            'id': item_id,
+            'data': data,
+            'error': describe(error) if error is not None else None,
+        }
+        with open(os.path.join(DEAD_LETTER_DIR, f"{collection}.jsonl"), 'ab') as f:
+            f.write(json_codec.dumps(entry) + b"\n")
+    except Exception as e:
+        print(f"Dead-letter kaydı yazılamadı ({collection}): {str(e)}")
+
+
+async def _write(call, collection: str, observer: Optional[WriteObserver] = None, action: str = "yazması") -> DirectusResponse:
+    """Tek bir isteği retry ve circuit breaker ile çalıştırır, son hatayı fırlatır"""
+    attempt = 0
+    while True:
+        probe = await breaker.before_call()
+        started_at = time.monotonic()
+        try:
+            response = await call()
+            # Gövdesi JSON olmayan hata yanıtları (proxy 502 sayfası) py_directus'ta hata fırlatmaz
+            if response.status_code and response.status_code >= 400:
+                raise TransientWriteError(f"HTTP {response.status_code}")
+        except Exception as e:
+            if observer:
+                observer(time.monotonic() - started_at, not is_transient(e))
+            if not is_transient(e):
+                if probe:
+                    breaker.record_success()
+                raise
+            breaker.record_failure(probe)
+            if probe:
+                # Devre açıkken başarısız denemeler kaydın hakkından düşmez;
+                # Directus düzelene ya da DirectusUnavailable fırlatılana kadar beklenir
+                continue
+            if attempt >= WRITE_MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+            print(f"{collection} {action} başarısız ({describe(e)}), {delay:.1f} sn sonra tekrar denenecek")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        else:
+            if observer:
+                observer(time.monotonic() - started_at, True)
+            breaker.record_success()
+            return response
+        finally:
+            # İptal (CancelledError) dahil her durumda deneme hakkı bırakılır
+            if probe:
+                breaker.release_probe()
+
+
+async def read(call, collection: str) -> DirectusResponse:
+    """
+    Okuma isteğini yazmalarla aynı retry ve circuit breaker üzerinden çalıştırır.
+    Okunamayan veri için dead-letter yoktur; son hata çağırana fırlatılır.
+    """
+    return await _write(call, collection, action="okuması")
+
+
+async def create_rows(directus: Directus, collection: str, rows: List[Dict], observer: Optional[WriteObserver] = None) -> List[Optional[Dict]]:
+    """
+    Kayıtları tek istekte oluşturur ve gönderim sırasıyla oluşan kayıtları döner;
+    yazılamayan kayıtların yerinde None olur. Kalıcı hatada kayıtlar tek tek denenir.
+    """
+    try:
+        response = await _write(lambda: directus.collection(collection).create(rows), collection, observer)
+    except DirectusUnavailable:
+        raise
+    except Exception as e:
+        if len(rows) > 1 and not is_transient(e):
+            print(f"{collection} toplu ekleme reddedildi ({describe(e)}), kayıtlar tek tek deneniyor")
+            created = []
+            for row in rows:
+                created.extend(await create_rows(directus, collection, [row], observer))
+            return created
+        print(f"{collection} eklenemedi, dead-letter'a yazıldı: {describe(e)}")
+        dead_letter(collection, 'create', rows, error=e)
+        return [None] * len(rows)
+
+    items = response.items or []
+    # Yanıt kayıt sayısıyla eşleşmiyorsa kayıtlar yazılmış ama id'leri bilinmiyor demektir
+    return items if len(items) == len(rows) else [{} for _ in rows]
+
+
+async def update_item(directus: Directus, collection: str, item_id: Any, data: Dict,
+                      observer: Optional[WriteObserver] = None) -> Optional[DirectusResponse]:
+    """Kaydı günceller. Yazılamazsa dead-letter'a düşer ve None döner"""
+    try:
+        return await _write(lambda: directus.collection(collection).update(item_id, data), collection, observer)
+    except DirectusUnavailable:
+        raise
+    except Exception as e:
+        if isinstance(e, DirectusException) and e.status_code == 404:
+            # Kayıt silinmiş, tekrar denemenin anlamı yok
+            print(f"{collection} {item_id} bulunamadı, güncelleme atlandı")
+            return None
+        print(f"{collection} {item_id} güncellenemedi, dead-letter'a yazıldı: {describe(e)}")
+        dead_letter(collection, 'update', data, item_id=item_id, error=e)
+        return None
+
+
+def _natural_key(row: Dict, key_fields: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(str(row.get(field)) for field in key_fields)
+
+
+async def _existing_ids(directus: Directus, collection: str, rows: List[Dict]) -> Dict[Tuple[str, ...], Any]:
+    """Satırlardan Directus'ta zaten bulunanların doğal anahtar -> id eşlemesi"""
+    key_fields = NATURAL_KEYS.get(collection)
+    if not key_fields:
+        return {}
+    *scope_fields, lookup_field = key_fields
+    groups: Dict[Tuple, set] = {}
+    for row in rows:
+        if all(row.get(field) is not None for field in key_fields):
+            groups.setdefault(tuple(row[field] for field in scope_fields), set()).add(row[lookup_field])
+
+    existing = {}
+    for scope, values in groups.items():
+        query_filter = F(**{f"{lookup_field}__in": list(values)})
+        for field, value in zip(scope_fields, scope):
+            query_filter = query_filter & F(**{field: value})
+        response = await read(
+            directus.collection(collection).filter(query_filter).fields('id', *key_fields).limit(-1).read, collection
+        )
+        for item in response.items or []:
+            existing.setdefault(_natural_key(item, key_fields), item['id'])
+    return existing
+
+
+async def _live_ids(directus: Directus, collection: str, item_ids: List[Any]) -> set:
+    """Verilen id'lerden Directus'ta hâlâ bulunanlar"""
+    response = await read(
+        directus.collection(collection).filter(F(id__in=item_ids)).fields('id').limit(-1).read, collection
+    )
+    return {str(item['id']) for item in response.items or []}
+
+
+async def replay_dead_letters(collection: Optional[str] = None) -> Dict[str, int]:
+    """
+    Dead-letter kayıtlarını yeniden gönderir. Dosya önce kenara alınır; yine
+    başarısız olanlar create_rows/update_item üzerinden yeni dosyaya düşer.
+    Eklenecek kayıt bu arada oluşturulduysa güncellenir; güncellenecek kayıt
+    silindiyse güncelleme atılır.
+    """
+    directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
+    pattern = f"{collection}.jsonl" if collection else "*.jsonl"
+    paths = glob.glob(os.path.join(DEAD_LETTER_DIR, pattern)) + glob.glob(os.path.join(DEAD_LETTER_DIR, pattern + ".replaying"))
+    totals = {'replayed': 0, 'failed': 0, 'dropped': 0}
+
+    for path in paths:
+        replaying = path if path.endswith(".replaying") else f"{path}.replaying"
+        if replaying != path:
+            os.replace(path, replaying)
+
+        creates: Dict[str, List[Dict]] = {}
+        updates: Dict[str, List[Tuple[Any, Dict]]] = {}
+        with open(replaying, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json_codec.loads(line)
+                if entry['operation'] == 'create':
+                    data = entry['data']
+                    creates.setdefault(entry['collection'], []).extend(data if isinstance(data, list) else [data])
+                else:
+                    updates.setdefault(entry['collection'], []).append((entry['id'], entry['data']))
+
+        for name, items in creates.items():
+            key_fields = NATURAL_KEYS.get(name)
+            if key_fields:
+                # Aynı kayıt birden çok kez dead-letter'a düşmüş olabilir, son hali geçerli
+                items = list({_natural_key(item, key_fields): item for item in items}.values())
+            for start in range(0, len(items), REPLAY_BATCH_SIZE):
+                batch = items[start:start + REPLAY_BATCH_SIZE]
+                existing = await _existing_ids(directus, name, batch)
+                new_rows = []
+                for item in batch:
+                    existing_id = existing.get(_natural_key(item, key_fields)) if key_fields else None
+                    if existing_id is None:
+                        new_rows.append(item)
+                    else:
+                        updates.setdefault(name, []).append((existing_id, item))
+                if new_rows:
+                    created = await create_rows(directus, name, new_rows)
+                    failed = created.count(None)
+                    totals['replayed'] += len(new_rows) - failed
+                    totals['failed'] += failed
+
+        for name, items in updates.items():
+            for start in range(0, len(items), REPLAY_BATCH_SIZE):
+                batch = items[start:start + REPLAY_BATCH_SIZE]
+                live = await _live_ids(directus, name, [item_id for item_id, _ in batch])
+                for item_id, data in batch:
+                    if str(item_id) not in live:
+                        totals['dropped'] += 1
+                        continue
+                    response = await update_item(directus, name, item_id, data)
+                    totals['replayed' if response is not None else 'failed'] += 1
+
+        os.remove(replaying)
+
+    print(f"Dead-letter replay: {totals['replayed']} kayıt yazıldı, {totals['failed']} kayıt yine başarısız, "
+          f"{totals['dropped']} güncelleme silinmiş kayda ait olduğu için atıldı")
+    return totals
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] != 'replay':
+        raise SystemExit("Kullanım: python directus_writer.py replay [collection]")
+    asyncio.run(replay_dead_letters(sys.argv[2] if len(sys.argv) > 2 else None))
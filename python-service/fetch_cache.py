@@ -0,0 +1,159 @@
+import os
+import gzip
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import json_codec
+
+# Paylaşılan yanıtların tutulduğu dizin, sayfalar bellekte değil diskte bekler
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "state/fetch_cache")
+# 0 ise sadece aynı çalışmadaki mağazalar paylaşır, >0 ise yanıtlar bu kadar
+# saniye boyunca sonraki çalışmalarda da kullanılır
+FETCH_CACHE_TTL = int(os.getenv("FETCH_CACHE_TTL", "0"))
+
+
+def upstream_key(store_data: Dict) -> Optional[Tuple[str, str]]:
+    """Mağazanın marketplace tarafındaki kimliği, aynı anahtara sahip mağazalar aynı veriyi çeker"""
+    store_type = (store_data.get('store_type') or '').lower()
+    api_info = store_data.get('api_connect_info') or {}
+
+    if store_type == 'trendyol' and api_info.get('store_id'):
+        return store_type, str(api_info['store_id'])
+    if store_type == 'hepsiburada' and api_info.get('store_url'):
+        return store_type, api_info['store_url'].split('?')[0].rstrip('/')
+    return None
+
+
+class SharedFetchCache:
+    """
+    Aynı marketplace mağazasına bağlı Directus mağazaları arasında istek paylaşımı.
+
+    store_import her çalışmada hangi upstream anahtarını kaç mağazanın kullandığını
+    register ile bildirir. Birden fazla tüketicisi olan anahtarlar için her
+    istek bir kez atılır, yanıt diske yazılır ve diğer mağazalar oradan okur.
+    Son tüketici okuduğunda (TTL yoksa) dosya silinir; TTL yoksa bu çalışma
+    başlamadan önce yazılmış (çöken bir çalışmadan kalan) dosyalar kullanılmaz.
+    Trendyol yorum sayfaları prefetch thread'lerinden de okunduğu için sayaçlar
+    kilitle güncellenir.
+    """
+
+    def __init__(self, cache_dir: str = FETCH_CACHE_DIR, ttl: int = FETCH_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._consumers: Dict[Tuple[str, str], int] = {}
+        self._reads: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._bookkeeping = threading.Lock()
+        self.started_at = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, marketplace: str, upstream_id: str, consumers: int) -> None:
+        self._consumers[(marketplace, upstream_id)] = consumers
+
+    def _is_shared(self, marketplace: str, upstream_id: str) -> bool:
+        return self.ttl > 0 or self._consumers.get((marketplace, upstream_id), 1) > 1
+
+    def _path(self, marketplace: str, upstream_id: str, request_key: str) -> str:
+        upstream_hash = hashlib.sha1(upstream_id.encode()).hexdigest()[:16]
+        request_hash = hashlib.sha1(request_key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, marketplace, upstream_hash, f"{request_hash}.json.gz")
+
+    def _read(self, path: str) -> Optional[Any]:
+        try:
+            modified_at = os.path.getmtime(path)
+            if (time.time() - modified_at > self.ttl) if self.ttl > 0 else (modified_at < self.started_at):
+                os.remove(path)
+                return None
+            with gzip.open(path, 'rb') as f:
+                return json_codec.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Fetch cache okunamadı ({path}): {str(e)}")
+            return None
+
+    def _write(self, path: str, value: Any) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Prefetch thread'leri aynı dosyayı aynı anda yazabilir, geçici dosya thread başına
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+                f.write(json_codec.dumps(value))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Fetch cache yazılamadı ({path}): {str(e)}")
+
+    def _count(self, hit: bool) -> None:
+        with self._bookkeeping:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _consume(self, marketplace: str, upstream_id: str, path: str) -> None:
+        """Son tüketici de okuduysa çalışma içi kaydı sil"""
+        with self._bookkeeping:
+            self._reads[path] = self._reads.get(path, 0) + 1
+            if self.ttl > 0:
+                return
+            if self._reads[path] < self._consumers.get((marketplace, upstream_id), 1):
+                return
+            self._reads.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_or_fetch(self, marketplace: str, upstream_id: str, request_key: str, fetcher: Callable[[], Any]) -> Any:
+        if not self._is_shared(marketplace, upstream_id):
+            return fetcher()
+
+        path = self._path(marketplace, upstream_id, request_key)
+        value = self._read(path)
+        self._count(value is not None)
+        if value is None:
+            value = fetcher()
+            if value is not None:
+                self._write(path, value)
+        self._consume(marketplace, upstream_id, path)
+        return value
+
+    async def aget_or_fetch(self, marketplace: str, upstream_id: str, request_key: str, fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        if not self._is_shared(marketplace, upstream_id):
+            return await fetcher()
+
+        path = self._path(marketplace, upstream_id, request_key)
+        # Aynı anda gelen istekler tek bir upstream isteğinde birleşir
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            value = self._read(path)
+            self._count(value is not None)
+            if value is None:
+                value = await fetcher()
+                if value is not None:
+                    self._write(path, value)
+            self._consume(marketplace, upstream_id, path)
+        self._locks.pop(path, None)
+        return value
+
+    def close(self) -> None:
+        """Çalışma sonunda tüketilmemiş (limit, hata) çalışma içi kayıtları temizle"""
+        if self.hits or self.misses:
+            print(f"Fetch cache: {self.hits} hit, {self.misses} miss")
+        with self._bookkeeping:
+            paths = list(self._reads) if self.ttl == 0 else []
+            self._reads.clear()
+            self._consumers.clear()
+        # Aynı süreçteki sonraki çalışma bu çalışmanın dosyalarını kullanmaz
+        self.started_at = time.time()
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+shared_fetch_cache = SharedFetchCache()
@@ -0,0 +1,70 @@
+"""
+extra_fields için alan projeksiyonu ve ham payload arşivi.
+
+Directus'a yalnızca whitelist'teki ek alanlar yazılır. Whitelist her tür için
+ortam değişkeniyle değiştirilebilir (virgülle ayrılmış alan listesi, "*" = hepsi):
+
+    TRENDYOL_PRODUCT_EXTRA_FIELDS, TRENDYOL_REVIEW_EXTRA_FIELDS,
+    HEPSIBURADA_PRODUCT_EXTRA_FIELDS, HEPSIBURADA_REVIEW_EXTRA_FIELDS
+
+RAW_PAYLOAD_DIR verilirse ham kayıtların tamamı sıkıştırılmış JSONL olarak
+bu dizine (soğuk depolama) yazılır.
+"""
+import os
+import gzip
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json_codec
+
+DEFAULT_EXTRA_FIELDS = {
+    ('trendyol', 'product'): (
+        'barcode', 'brand', 'brandId', 'productMainId', 'listPrice',
+        'quantity', 'vatRate', 'pimCategoryId', 'attributes',
+    ),
+    ('trendyol', 'review'): ('id', 'userFullName', 'trusted', 'lastModifiedDate'),
+    ('hepsiburada', 'product'): ('brand', 'rating', 'merchant_id', 'merchant_name', 'category_id'),
+    ('hepsiburada', 'review'): ('isPurchaseVerified', 'merchant'),
+}
+
+RAW_PAYLOAD_DIR = os.getenv("RAW_PAYLOAD_DIR")
+
+_extra_fields_cache: Dict[Tuple[str, str], Optional[Tuple[str, ...]]] = {}
+
+
+def extra_fields_for(marketplace: str, kind: str) -> Optional[Tuple[str, ...]]:
+    """Whitelist'i döner; None tüm alanların tutulacağı anlamına gelir"""
+    key = (marketplace, kind)
+    if key not in _extra_fields_cache:
+        configured = os.getenv(f"{marketplace.upper()}_{kind.upper()}_EXTRA_FIELDS")
+        if configured is None:
+            fields = DEFAULT_EXTRA_FIELDS.get(key, ())
+        elif configured.strip() == '*':
+            fields = None
+        else:
+            fields = tuple(f.strip() for f in configured.split(',') if f.strip())
+        _extra_fields_cache[key] = fields
+    return _extra_fields_cache[key]
+
+
+def project(record: Dict, fields: Optional[Tuple[str, ...]], exclude: Iterable[str] = ()) -> Dict:
+    """Kayıttan sadece istenen alanları alır; fields None ise exclude dışındaki her şey"""
+    if fields is None:
+        excluded = set(exclude)
+        return {key: value for key, value in record.items() if key not in excluded}
+    return {key: record[key] for key in fields if key in record}
+
+
+def archive_raw(marketplace: str, store_id: Any, kind: str, records: List[Dict]) -> None:
+    """Ham kayıtları gzip JSONL olarak soğuk depolamaya ekler (RAW_PAYLOAD_DIR yoksa bir şey yapmaz)"""
+    if not RAW_PAYLOAD_DIR or not records:
+        return
+    try:
+        directory = os.path.join(RAW_PAYLOAD_DIR, marketplace, str(store_id))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{kind}-{datetime.now().strftime('%Y%m%d')}.jsonl.gz")
+        lines = b"".join(json_codec.dumps(record) + b"\n" for record in records)
+        # Her çağrı ayrı bir gzip üyesi ekler, dosya yine tek parça okunabilir
+        with gzip.open(path, 'ab') as f:
+            f.write(lines)
+    except Exception as e:
+        print(f"Ham veri arşivlenemedi ({marketplace}/{store_id}/{kind}): {str(e)}")
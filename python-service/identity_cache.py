@@ -0,0 +1,151 @@
+"""
+Ürün ve yorum kimlikleri için çalışmalar arası paylaşılan cache.
+
+Marketplace anahtarından Directus id'sine eşlemeler (ör. mağaza + product_id
+-> products.id, review_target_id -> reviews.id) önce süreç içi LRU'da, sonra
+REDIS_URL verildiyse Redis'te aranır; yalnızca bulunamayanlar Directus'tan
+okunur. Yazma sırasında öğrenilen id'ler cache'e eklenir, başarısız bir
+yazmada ilgili anahtar silinir ve bir sonraki seferde Directus'tan okunur.
+
+Her cron çalışması ayrı bir süreç olduğundan LRU tek başına çalışmalar arası
+isabet sağlamaz; docker-compose'da REDIS_URL redis servisinin 1 numaralı
+veritabanını gösterir.
+
+Anahtar alanları:
+    product      store_type:store:product_id -> products.id
+    product_sku  store_type:store:sku        -> products.id
+    review       review_target_id            -> reviews.id
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json_codec
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis opsiyonel, yoksa sadece LRU kullanılır
+    redis = None
+
+REDIS_URL = os.getenv("REDIS_URL")
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", str(7 * 24 * 3600)))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "100000"))
+KEY_PREFIX = "review-import:identity"
+
+
+def product_key(store_type: str, store_id: Any, product_id: Any) -> str:
+    return f"{store_type}:{store_id}:{product_id}"
+
+
+class IdentityCache:
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, ttl: int = IDENTITY_CACHE_TTL, max_size: int = IDENTITY_CACHE_SIZE):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lru: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._redis = None
+        self._redis_failed = False
+        self.hits = 0
+        self.misses = 0
+
+    def _client(self):
+        if self._redis is None and self.redis_url and redis is not None and not self._redis_failed:
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    def _redis_error(self, e: Exception) -> None:
+        # Redis erişilemiyorsa çalışmanın geri kalanında sadece LRU kullanılır
+        print(f"Identity cache Redis'e erişemedi, sadece bellek içi cache kullanılacak: {str(e)}")
+        self._redis_failed = True
+        self._redis = None
+
+    def _redis_key(self, namespace: str, key: str) -> str:
+        return f"{KEY_PREFIX}:{namespace}:{key}"
+
+    def _remember(self, lru_key: str, value: Any) -> None:
+        self._lru[lru_key] = (value, time.monotonic() + self.ttl)
+        self._lru.move_to_end(lru_key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def _recall(self, lru_key: str) -> Optional[Any]:
+        entry = self._lru.get(lru_key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._lru[lru_key]
+            return None
+        self._lru.move_to_end(lru_key)
+        return value
+
+    async def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Bilinen anahtarlar için id'leri döner, bulunamayanlar sonuçta yer almaz"""
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        missing = []
+        for key in unique_keys:
+            value = self._recall(f"{namespace}:{key}")
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        client = self._client()
+        if missing and client is not None:
+            try:
+                values = await client.mget([self._redis_key(namespace, key) for key in missing])
+            except Exception as e:
+                self._redis_error(e)
+                values = []
+            for key, raw in zip(missing, values):
+                if raw is not None:
+                    value = json_codec.loads(raw)
+                    found[key] = value
+                    self._remember(f"{namespace}:{key}", value)
+
+        self.hits += len(found)
+        self.misses += len(unique_keys) - len(found)
+        return found
+
+    async def set_many(self, namespace: str, mapping: Dict[str, Any]) -> None:
+        if not mapping:
+            return
+        for key, value in mapping.items():
+            self._remember(f"{namespace}:{key}", value)
+
+        client = self._client()
+        if client is not None:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    for key, value in mapping.items():
+                        pipe.set(self._redis_key(namespace, key), json_codec.dumps(value), ex=self.ttl)
+                    await pipe.execute()
+            except Exception as e:
+                self._redis_error(e)
+
+    async def invalidate(self, namespace: str, keys: List[str]) -> None:
+        if not keys:
+            return
+        for key in keys:
+            self._lru.pop(f"{namespace}:{key}", None)
+
+        client = self._client()
+        if client is not None:
+            try:
+                await client.delete(*[self._redis_key(namespace, key) for key in keys])
+            except Exception as e:
+                self._redis_error(e)
+
+    async def close(self) -> None:
+        if self.hits or self.misses:
+            print(f"Identity cache: {self.hits} hit, {self.misses} miss")
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception:
+                pass
+            self._redis = None
+
+
+identity_cache = IdentityCache()
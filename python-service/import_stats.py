@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import tempfile
+from typing import Any, Dict, List, Optional
+
+# Mağaza başına geçmiş import istatistikleri (her mağaza için bir JSON dosyası)
+IMPORT_STATS_DIR = os.getenv("IMPORT_STATS_DIR", "state/import_stats")
+# Geçmişi olmayan (yeni) mağazalar için tahmini süre; küçük tutulur ki ilk import'lar öne geçsin
+NEW_STORE_COST_SECONDS = float(os.getenv("NEW_STORE_COST_SECONDS", "30"))
+# Hiç tamamlanmamış mağazanın süresini kayıt sayısından tahmin etmek için kayıt başına süre
+ITEM_COST_SECONDS = float(os.getenv("ITEM_COST_SECONDS", "0.02"))
+# Bekleme süresinin önceliğe etkisi; büyük mağazalar da beklerken öne geçer
+SCHEDULER_AGING_WEIGHT = float(os.getenv("SCHEDULER_AGING_WEIGHT", "1"))
+# Tahmini süre için yeni ölçümün ağırlığı (üstel ortalama)
+COST_SMOOTHING = 0.5
+
+
+class StoreStats:
+    """
+    Bir mağazanın geçmiş import süresi ve kayıt sayıları.
+
+    Kullanılan anahtarlar:
+        runs: Tamamlanan import sayısı
+        cost_s: Tamamlanan import'ların süre ortalaması (saniye)
+        partial_s: Yarıda kalan çalışmalarda harcanan, henüz tamamlanmamış süre
+        products, reviews: Son import sonrası mağazadaki kayıt sayıları
+        waiting_since: Mağazanın sırada beklemeye başladığı zaman
+        last_finished_at: Son çalışmanın bittiği zaman
+    """
+
+    def __init__(self, store_id: Any, state: Optional[Dict] = None):
+        self.store_id = store_id
+        self.state = state or {}
+
+    @staticmethod
+    def path_for(store_id: Any) -> str:
+        return os.path.join(IMPORT_STATS_DIR, f"{store_id}.json")
+
+    @classmethod
+    def load(cls, store_id: Any) -> 'StoreStats':
+        try:
+            with open(cls.path_for(store_id), encoding="utf-8") as f:
+                return cls(store_id, json.load(f))
+        except FileNotFoundError:
+            return cls(store_id)
+        except Exception as e:
+            print(f"Import istatistiği okunamadı ({store_id}): {str(e)}")
+            return cls(store_id)
+
+    @property
+    def is_new(self) -> bool:
+        return not self.state.get('runs')
+
+    def estimated_cost(self) -> float:
+        """
+        Bir sonraki import'un tahmini süresi, yarıda kalmışsa kalan kısmı.
+        Hiç tamamlanmamış mağazada toplam süre bilinen kayıt sayısından tahmin
+        edilir. Yarıda kalan süre tahmini aştıysa mağaza beklenenden büyüktür;
+        kalan kısım en az harcanan kadar kabul edilir, böylece sürekli yarıda
+        kalan büyük mağazalar küçük/yeni mağaza gibi öne geçmez.
+        """
+        partial = self.state.get('partial_s', 0)
+        if self.is_new:
+            items = (self.state.get('products') or 0) + (self.state.get('reviews') or 0)
+            total = max(NEW_STORE_COST_SECONDS, items * ITEM_COST_SECONDS)
+        else:
+            total = self.state['cost_s']
+        if partial >= total:
+            return partial
+        return max(1.0, total - partial)
+
+    def waiting_seconds(self, now: float) -> float:
+        return max(0.0, now - self.state.get('waiting_since', now))
+
+    def mark_waiting(self, now: float) -> bool:
+        """Mağaza sıraya ilk kez girdiyse beklemeye başladığı zamanı not eder"""
+        if 'waiting_since' in self.state:
+            return False
+        self.state['waiting_since'] = now
+        return True
+
+    def record_run(self, duration: float, finished: bool, products: Optional[int] = None, reviews: Optional[int] = None) -> None:
+        if finished:
+            total = duration + self.state.pop('partial_s', 0)
+            previous = self.state.get('cost_s')
+            self.state['cost_s'] = total if previous is None else COST_SMOOTHING * total + (1 - COST_SMOOTHING) * previous
+            self.state['runs'] = self.state.get('runs', 0) + 1
+        else:
+            self.state['partial_s'] = self.state.get('partial_s', 0) + duration
+        if products is not None:
+            self.state['products'] = products
+        if reviews is not None:
+            self.state['reviews'] = reviews
+        self.state.pop('waiting_since', None)
+        self.state['last_finished_at'] = time.time()
+
+    def save(self) -> None:
+        os.makedirs(IMPORT_STATS_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=IMPORT_STATS_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path_for(self.store_id))
+        except Exception as e:
+            print(f"Import istatistiği kaydedilemedi ({self.store_id}): {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def priority(stats: StoreStats, now: float) -> float:
+    """
+    Response ratio: (bekleme + tahmini süre) / tahmini süre. Kısa işler önce
+    gelir, uzun işlerin oranı beklerken büyüdüğü için sonunda onlar da öne geçer.
+    """
+    cost = stats.estimated_cost()
+    return (SCHEDULER_AGING_WEIGHT * stats.waiting_seconds(now) + cost) / cost
+
+
+def schedule_stores(stores: List[Dict], limit: int, now: Optional[float] = None) -> List[Dict]:
+    """
+    Sıradaki mağazaları seçer: önce her kullanıcının en öncelikli mağazası,
+    sonra ikincisi... Tur içinde kullanıcılar mağazalarının önceliğine göre dizilir;
+    böylece çok mağazalı bir kullanıcı diğerlerini bekletmez.
+    """
+    now = time.time() if now is None else now
+    queues: Dict[Any, List] = {}
+    for store in stores:
+        stats = StoreStats.load(store['id'])
+        if stats.mark_waiting(now):
+            stats.save()
+        # Eşit öncelikte kısa iş önce
+        queues.setdefault(store.get('user'), []).append(((priority(stats, now), -stats.estimated_cost()), store))
+
+    for queue in queues.values():
+        queue.sort(key=lambda entry: entry[0], reverse=True)
+
+    ordered = []
+    rounds = max((len(queue) for queue in queues.values()), default=0)
+    for index in range(rounds):
+        heads = [queue[index] for queue in queues.values() if index < len(queue)]
+        heads.sort(key=lambda entry: entry[0], reverse=True)
+        ordered.extend(store for _, store in heads)
+    return ordered[:limit]
@@ -0,0 +1,106 @@
+"""
+Marketplace yanıtları ve yerel dosyalar için JSON codec.
+
+orjson kuruluysa çözme/kodlama onunla yapılır, değilse stdlib json kullanılır.
+JSON_CODEC=stdlib ile hızlı yol kapatılabilir.
+
+Büyük belgelerden (Hepsiburada reduxStore) sadece gereken alt ağaçları almak
+için ijson ile artımlı ayrıştırma da vardır; JSON_INCREMENTAL=1 ile açılır,
+ijson yoksa tam çözmeye düşülür.
+"""
+import os
+import re
+import json
+from typing import Any, Dict, Optional, Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # orjson opsiyonel
+    orjson = None
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # ijson opsiyonel
+    ijson = None
+
+USE_ORJSON = orjson is not None and os.getenv("JSON_CODEC", "orjson").lower() != "stdlib"
+USE_INCREMENTAL = ijson is not None and os.getenv("JSON_INCREMENTAL", "0") == "1"
+
+_SCALAR_EVENTS = ('null', 'boolean', 'integer', 'double', 'number', 'string')
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """UTF-8 kodlanmış JSON (ASCII kaçışı yok)"""
+    if USE_ORJSON:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode('utf-8')
+
+
+def extract(data: Union[str, bytes], paths: Sequence[str]) -> Dict[str, Any]:
+    """
+    Belgeden sadece verilen noktalı yollardaki (ör. 'merchantState.merchantSearch')
+    değerleri döner. Artımlı modda ağacın geri kalanı kurulmaz ve son yol
+    okunduktan sonra ayrıştırma durur. Bulunamayan yollar sonuçta yer almaz.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    if not USE_INCREMENTAL:
+        document = loads(data)
+        results = {}
+        for path in paths:
+            value = document
+            for key in path.split('.'):
+                if not isinstance(value, dict) or key not in value:
+                    break
+                value = value[key]
+            else:
+                results[path] = value
+        return results
+
+    wanted = set(paths)
+    results = {}
+    active: Optional[str] = None
+    builder = None
+    for prefix, event, value in ijson.parse(data, use_float=True):
+        if active is None:
+            if prefix not in wanted or prefix in results:
+                continue
+            if event in ('start_map', 'start_array'):
+                active, builder = prefix, ObjectBuilder()
+                builder.event(event, value)
+            elif event in _SCALAR_EVENTS:
+                results[prefix] = value
+        else:
+            builder.event(event, value)
+            if prefix == active and event in ('end_map', 'end_array'):
+                results[active] = builder.value
+                active, builder = None, None
+        if active is None and len(results) == len(wanted):
+            break
+    return results
+
+
+def find_script(html: str, script_id: str) -> Optional[str]:
+    """
+    <script id="...">içerik</script> bloğunun içeriğini HTML'i ayrıştırmadan bulur.
+    Etiket beklenen biçimde değilse None döner (çağıran BeautifulSoup'a düşebilir).
+    """
+    match = re.search(r'<script\b[^>]*\bid=["\']%s["\'][^>]*>' % re.escape(script_id), html)
+    if not match:
+        return None
+    end = html.find('</script>', match.end())
+    if end == -1:
+        return None
+    return html[match.end():end]
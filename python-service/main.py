@@ -1,75 +1,118 @@
 import os
-import asyncio
-import importlib
-from datetime import datetime
-from py_directus import Directus, F
+import json
+import time
+import argparse
+import warnings
+import urllib.parse
+import urllib.request
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
+# (aşağıdaki modüller ayarlarını import sırasında okur)
 load_dotenv()
 
-# TODO: Eğer bir mağaza işlemeye başlandıysa o işlem tekrar geldiğinde onu atla
+from checkpoint import CHECKPOINT_STALE_SECONDS, INTERRUPTED_STATUS, ImportCheckpoint
 
-async def process_store(store_data):
-    store_type = store_data.get('store_type', '').lower()
-    try:
-        # Directus bağlantısını oluştur
-        directus_api_url = os.getenv("DIRECTUS_API_URL")
-        directus_api_token = os.getenv("DIRECTUS_API_TOKEN")
-        directus = await Directus(directus_api_url, token=directus_api_token)
-
-        # Mağazanın import durumunu "fetching_store_reviews" olarak güncelle
-        stores_collection = directus.collection('stores')
-        await stores_collection.update(store_data['id'], {
-            'import_status': 'fetching_store_reviews'
-        })
-
-        # Dynamically import the appropriate parser module
-        parser_module = importlib.import_module(f'parsers.{store_type}')
-        
-        print("Parser module: ", store_type)
-        print("Store data: ", store_data)
-        
-        # Call the parse_store function from the parser module
-        parse_result = await parser_module.parse_store(store_data)
-        
-        if parse_result:
-            await stores_collection.update(store_data['id'], {
-                'import_status': 'store_reviews_fetched'
-            })
+# py_directus'un pydantic modelleri her çalışmada bu uyarıyı cron.log'a basıyor
+warnings.filterwarnings('ignore', message='Field name "schema"', category=UserWarning)
 
-    except Exception as e:
-        print(f"Error in process_store: {str(e)}")
-        # Hata durumunda import_status'u "error" olarak güncelle
-        stores_collection = directus.collection('stores')
-        await stores_collection.update(store_data['id'], {
-            'import_status': 'error'
-        })
+# İşlenecek (ya da yarıda kalıp devam edilecek) mağazaların durumları
+PENDING_STATUSES = ('product_info_not_fetched', INTERRUPTED_STATUS)
+# İşlenmekte olan mağazalar; yalnızca checkpoint'i (yoksa mağaza kaydı) eskimişse, yani süreci ölmüşse iş sayılır
+IN_PROGRESS_STATUS = 'fetching_store_reviews'
+# Boş çalışma kontrolünde okunacak en fazla mağaza; sınıra takılırsa iş var sayılır
+PENDING_CHECK_LIMIT = 100
+# Boş çalışma kontrolünün zaman aşımı (sn)
+PENDING_CHECK_TIMEOUT = float(os.getenv("PENDING_CHECK_TIMEOUT", "10"))
 
-async def fetch_store_data():
+def has_pending_stores() -> bool:
+    """
+    Cron her dakika çalışır ve çoğu zaman işlenecek mağaza yoktur. Bu durumda
+    py_directus ve parser bağımlılıkları yüklenmeden tek bir hafif istekle
+    çıkılır. Yarıda kalıp bekleme süresi dolmamış mağazalar ve checkpoint'i
+    taze olan (hâlâ çalışan) import'lar iş sayılmaz. Kontrol yapılamazsa
+    (ağ hatası vb.) normal akışa devam edilir.
+    """
+    conditions = [{'import_status': {'_in': list(PENDING_STATUSES)}}]
+    abandoned_ids = ImportCheckpoint.abandoned_ids()
+    if abandoned_ids:
+        conditions.append({'_and': [
+            {'import_status': {'_eq': IN_PROGRESS_STATUS}},
+            {'id': {'_in': abandoned_ids}},
+        ]})
+    # İlk checkpoint yazılmadan ölen import'lar: recover_stalled_stores gibi
+    # mağaza kaydının son güncellenme zamanına bakılır (checkpoint'i taze olanlar hariç)
+    cutoff = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - CHECKPOINT_STALE_SECONDS))
+    stalled = [
+        {'import_status': {'_eq': IN_PROGRESS_STATUS}},
+        {'_or': [
+            {'date_updated': {'_lt': cutoff}},
+            {'_and': [{'date_updated': {'_null': True}}, {'date_created': {'_lt': cutoff}}]},
+        ]},
+    ]
+    fresh_ids = ImportCheckpoint.fresh_ids()
+    if fresh_ids:
+        stalled.append({'id': {'_nin': fresh_ids}})
+    conditions.append({'_and': stalled})
+    query = urllib.parse.urlencode({
+        'filter': json.dumps({'_or': conditions}),
+        'fields': 'id,import_status',
+        'limit': PENDING_CHECK_LIMIT,
+    })
+    request = urllib.request.Request(
+        f"{os.getenv('DIRECTUS_API_URL')}/items/stores?{query}",
+        headers={'Authorization': f"Bearer {os.getenv('DIRECTUS_API_TOKEN')}"}
+    )
     try:
-        directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
-        stores_collection = directus.collection('stores') \
-            .filter(F(import_status='product_info_not_fetched')) \
-            .limit(10)
-        
-        #.filter(F(id='79')) \
+        with urllib.request.urlopen(request, timeout=PENDING_CHECK_TIMEOUT) as response:
+            stores = json.loads(response.read()).get('data') or []
+    except Exception as e:
+        print(f"Bekleyen mağaza kontrolü yapılamadı, devam ediliyor: {str(e)}")
+        return True
+    if len(stores) >= PENDING_CHECK_LIMIT:
+        return True
+    return any(
+        store.get('import_status') != INTERRUPTED_STATUS or ImportCheckpoint.retry_due(store['id'])
+        for store in stores
+    )
 
-        print("Getting stores...")
-        stores = await stores_collection.read()
-        
-        if not stores.items:
-            print("Hiç mağaza bulunamadı.")
-            return
-        
-        print(f"Toplam {len(stores.items)} mağaza bulundu.")
+def run_workers(workers: int) -> None:
+    """
+    Replikanın shard'ını workers sürece böler; HTML/JSON ayrıştırma ve
+    upstream istek bütçesi süreçler arasında paylaşılır.
+    """
+    # İş olduğu belli olduktan sonra yüklenir (py_directus, pydantic, httpx...)
+    import asyncio
+    import multiprocessing
+    from sharding import SHARD_COUNT, SHARD_INDEX
+    from store_import import fetch_store_data, run_worker
 
-        # Process each store
-        for store in stores.items:
-            await process_store(store)
+    if workers <= 1:
+        asyncio.run(fetch_store_data())
+        return
 
-    except Exception as e:
-        print(f"Error in fetch_store_data: {str(e)}")
+    ctx = multiprocessing.get_context('spawn')
+    processes = [
+        ctx.Process(
+            target=run_worker,
+            args=(SHARD_INDEX * workers + worker, SHARD_COUNT * workers),
+            name=f"import-worker-{worker}"
+        )
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            print(f"{process.name} {process.exitcode} koduyla çıktı")
 
 if __name__ == "__main__":
-    asyncio.run(fetch_store_data())
+    parser = argparse.ArgumentParser(description="Mağaza import'larını çalıştırır")
+    parser.add_argument('--workers', type=int, default=int(os.getenv("IMPORT_WORKERS", "1")),
+                        help="Bu replikada paralel çalışacak süreç sayısı")
+    args = parser.parse_args()
+    if has_pending_stores():
+        run_workers(args.workers)
+    else:
+        print("Hiç mağaza bulunamadı.")
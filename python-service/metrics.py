@@ -0,0 +1,62 @@
+"""
+Süreç içi metrikler: gauge'lar (anlık değer) ve sayaçlar.
+
+METRICS_FILE verildiyse değerler en fazla METRICS_FLUSH_SECONDS aralıkla bu
+JSON dosyasına yazılır; dashboard veya izleme aracı dosyayı okuyabilir.
+Birden fazla worker süreci aynı dosyaya yazmasın diye adda {pid} kullanılabilir,
+ör. METRICS_FILE=state/metrics/import.{pid}.json
+"""
+import os
+import json
+import time
+import tempfile
+from typing import Dict
+
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "10"))
+
+_gauges: Dict[str, float] = {}
+_counters: Dict[str, float] = {}
+_last_flush = 0.0
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in sorted(labels.items())) + "}"
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    _gauges[_key(name, labels)] = value
+    flush()
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+    flush()
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    return {'gauges': dict(_gauges), 'counters': dict(_counters)}
+
+
+def flush(force: bool = False) -> None:
+    global _last_flush
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_SECONDS:
+        return
+    _last_flush = now
+
+    path = METRICS_FILE.replace("{pid}", str(os.getpid()))
+    directory = os.path.dirname(path) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({'updated_at': time.time(), **snapshot()}, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Metrikler yazılamadı: {str(e)}")
@@ -1,15 +1,38 @@
-import json
 import aiohttp
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 import asyncio
+import contextlib
+import math
 from datetime import datetime
 import os
 from py_directus import Directus, F
+from py_directus.directus_response import DirectusException
 from subscription_manager import initialize_subscription_limits, update_subscription_usage, SubscriptionLimits
+from checkpoint import ImportCheckpoint, failure_status
+from fetch_cache import shared_fetch_cache, upstream_key
+from review_transform import iso_strings_to_dates, sentiments
+from directus_lookup import fetch_existing_review_ids, iter_collection, count_items, remember_created
+from identity_cache import identity_cache, product_key
+from field_projection import extra_fields_for, project, archive_raw
+from records import ProductRecord, ReviewRecord, encode_extra
+import json_codec
+from bulk_loader import BulkLoader, get_bulk_loader, invalidate_directus_cache
+from directus_writer import DirectusUnavailable, is_transient, read
+from write_scheduler import write_scheduler
+from identity_pool import identity_pool, random_user_agent
 
 # Global variables
 STORE_TYPE = 'hepsiburada'
+HEPSIBURADA_REVIEWS_API_URL = os.getenv("HEPSIBURADA_REVIEWS_API_URL", "https://user-content-gw-hermes.hepsiburada.com")
+# Bir kimliğin istekleri arasındaki en kısa süre (saniye), benchmark'ta 0 yapılabilir;
+# toplam hız identity_pool'daki kimlik sayısıyla artar
+REQUEST_DELAY = float(os.getenv("HEPSIBURADA_REQUEST_DELAY", "1"))
+REQUEST_RATE = 1 / REQUEST_DELAY if REQUEST_DELAY > 0 else 0
+# Aynı anda yorumları çekilen en fazla ürün (varsayılan: havuzdaki kimlik sayısı)
+REVIEW_CONCURRENCY = int(os.getenv("HEPSIBURADA_REVIEW_CONCURRENCY", "0"))
+# Aynı anda çekilecek en fazla listeleme sayfası
+PAGE_PREFETCH_CONCURRENCY = int(os.getenv("HEPSIBURADA_PAGE_CONCURRENCY", "4"))
 
 async def parse_store(store_data: Dict) -> bool:
     try:
@@ -45,8 +68,12 @@ async def parse_store(store_data: Dict) -> bool:
         print("Store URL: ", store_url)
         print("Directus store ID: ", directus_store_id)
         
-        # Mağaza bilgilerini çek
-        store_details = await get_store_details(store_url)
+        # Mağaza bilgileri ve ilk ürün sayfası aynı sayfadan tek istekle gelir
+        store_page = await shared_fetch_cache.aget_or_fetch(
+            STORE_TYPE, upstream_key(store_data)[1], "store_page:1",
+            lambda: fetch_store_page(store_url, 1)
+        )
+        store_details = store_page['details'] if store_page else None
         print("Store details: ", store_details)
         if store_details:
             await update_store_info(directus_store_id, store_details)
@@ -54,52 +81,42 @@ async def parse_store(store_data: Dict) -> bool:
             await update_import_status(store_data['id'], 'store_details_fetch_failed')
             return False
         
+        checkpoint = ImportCheckpoint.load(directus_store_id)
+
         # Ürünleri çek
-        products_result = await fetch_all_products(store_url, directus_store_id, store_data, subscription_limits)
-        
-        if not products_result:
-            await update_import_status(store_data['id'], 'error_while_fetching_product_info')
-            return False
+        if not checkpoint.get('products_done'):
+            products_result = await fetch_all_products(store_url, directus_store_id, store_data, subscription_limits, checkpoint, first_page=store_page['listing'])
+            
+            if not products_result:
+                await update_import_status(store_data['id'], failure_status(store_data['id'], 'error_while_fetching_product_info'))
+                return False
+
+            checkpoint.advance(products_done=True)
+            checkpoint.save()
+
+        # Yorumlar için ürünler Directus üzerinden okunacak
+        await invalidate_directus_cache()
             
         # Tüm ürünler için yorumları çek
-        await process_all_reviews(directus_store_id, store_data, subscription_limits)
+        await process_all_reviews(directus_store_id, store_data, subscription_limits, checkpoint)
 
 
         # İşlem sonunda kullanım istatistiklerini güncelle
         await update_subscription_usage(directus, user_id, subscription_limits)
         
+        checkpoint.clear()
         await update_import_status(store_data['id'], 'store_reviews_fetched')
         return True
         
     except Exception as e:
         print(f"Hata oluştu: {str(e)}")
-        await update_import_status(store_data['id'], 'error')
+        await update_import_status(store_data['id'], failure_status(store_data['id']))
         return False
 
-async def get_store_details(store_url: str) -> Optional[Dict]:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:132.0) Gecko/20100101 Firefox/132.0",
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'tr,en-US;q=0.7,en;q=0.3',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
-    
+def merchant_details_from(merchant_state: Dict) -> Optional[Dict]:
+    """reduxStore'daki merchantDetail'den Directus'a yazılan mağaza bilgileri"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(store_url, headers=headers) as response:
-                html = await response.text()
-                
-        soup = BeautifulSoup(html, 'html.parser')
-        redux_store = soup.find('script', {'id': 'reduxStore'})
-        
-        if not redux_store:
-            return None
-            
-        store_data = json.loads(redux_store.string)
-        merchant_detail = store_data['merchantState']['merchantDetail']
-        
+        merchant_detail = merchant_state['merchantDetail']
         return {
             'name': merchant_detail['name'],
             'brand_name': merchant_detail['brandName'],
@@ -112,10 +129,24 @@ async def get_store_details(store_url: str) -> Optional[Dict]:
             'rating_count': merchant_detail['ratingSummary']['ratingQuantity'],
             'tags': merchant_detail['tagList']
         }
-    except Exception as e:
-        print(f"Mağaza detayları alınırken hata: {str(e)}")
+    except (KeyError, TypeError) as e:
+        print(f"Mağaza detayları okunamadı: {str(e)}")
         return None
 
+def product_listing_from(merchant_state: Dict) -> Optional[Dict]:
+    """reduxStore'daki merchantSearch'ten sayfanın ürün listesi"""
+    merchant_search = merchant_state.get('merchantSearch') or {}
+
+    # Check if required fields exist
+    if 'totalProductCount' not in merchant_search or 'products' not in merchant_search:
+        print("Required fields missing in merchant_search")
+        return None
+
+    return {
+        'totalProductCount': merchant_search['totalProductCount'],
+        'products': merchant_search['products']
+    }
+
 async def update_store_info(store_id: str, store_details: Dict) -> None:
     try:
         directus_api_url = os.getenv("DIRECTUS_API_URL")
@@ -138,14 +169,26 @@ async def update_store_info(store_id: str, store_details: Dict) -> None:
     except Exception as e:
         print(f"Mağaza bilgileri güncellenirken hata: {str(e)}")
 
-async def fetch_all_products(store_url: str, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits) -> bool:
+async def fetch_all_products(store_url: str, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits, checkpoint: Optional[ImportCheckpoint] = None, first_page: Optional[Dict] = None) -> bool:
     try:
         page = 1
         total_products = None
         processed_products = 0
         
-        # İlk sayfadan toplam ürün sayısını al
-        first_page = await fetch_page_products(store_url, page)
+        upstream_id = upstream_key(store_data)[1]
+        # IMPORT_SINK=postgres ise ürünler sayfa sayfa doğrudan veritabanına yazılır
+        loader = await get_bulk_loader()
+
+        async def fetch_page(page: int) -> Optional[Dict]:
+            # Aynı Hepsiburada mağazasına bağlı diğer mağazalarla paylaşılır
+            return await shared_fetch_cache.aget_or_fetch(
+                STORE_TYPE, upstream_id, f"products:{page}",
+                lambda: fetch_page_products(store_url, page)
+            )
+
+        # İlk sayfadan toplam ürün sayısını al (mağaza sayfasıyla birlikte çekildiyse tekrar istenmez)
+        if first_page is None:
+            first_page = await fetch_page(page)
         if first_page and 'totalProductCount' in first_page:
             total_products = first_page['totalProductCount']
             products = first_page['products']
@@ -155,42 +198,119 @@ async def fetch_all_products(store_url: str, store_id: str, store_data: Dict, su
 
         print(f"Toplam ürün sayısı: {total_products}")
 
-        while True:
-            if not products:
-                print(f"Sayfa {page} için ürün bulunamadı")
-                break
-            
-            for product in products:
-                # Limit kontrolü
-                if not subscription_limits.can_add_product():
-                    print("Ürün limiti aşıldı, işlem durduruluyor...")
-                    return True
-                    
-                await save_product(product, store_id, store_data, subscription_limits)
-                processed_products += 1
-            
-            if processed_products >= total_products:
-                print(f"Tüm ürünler işlendi. Toplam: {processed_products}")
-                break
-            
-            page += 1
-            page_data = await fetch_page_products(store_url, page)
-            if not page_data:
-                break
-            products = page_data['products']
-            
-            # Her 10 ürün işlendikten sonra kısa bir bekleme
-            if processed_products % 10 == 0:
-                await asyncio.sleep(1)
+        if not products:
+            print(f"Sayfa {page} için ürün bulunamadı")
+            return True
+
+        # İlk sayfa ile toplam sayfa sayısı belli olur
+        page_size = len(products)
+        total_pages = max(1, math.ceil(total_products / page_size))
+
+        # Yarıda kalan import'ta işlenmiş sayfaları atla
+        start_page = checkpoint.get('product_page', 1) if checkpoint else 1
+        if start_page > 1:
+            processed_products = (start_page - 1) * page_size
+            print(f"Ürün import'una {start_page}. sayfadan devam ediliyor")
+
+        # Sayfa 1 elde; kalan sayfalar yazma işlemiyle paralel olarak önceden çekilir
+        pages = prefetch_pages(fetch_page, max(start_page, 1), total_pages, PAGE_PREFETCH_CONCURRENCY, ready={1: first_page})
+        async with contextlib.aclosing(pages):
+            async for page, page_data in pages:
+                products = page_data['products'] if page_data else []
+                if not products:
+                    print(f"Sayfa {page} için ürün bulunamadı")
+                    break
+
+                archive_raw(STORE_TYPE, store_id, 'products', products)
+
+                if loader:
+                    if not await bulk_save_products(products, store_id, store_data, subscription_limits, loader):
+                        return True
+                    processed_products += len(products)
+                else:
+                    if not await save_products(products, store_id, store_data, subscription_limits):
+                        print("Ürün limiti aşıldı, işlem durduruluyor...")
+                        return True
+                    processed_products += len(products)
+
+                if checkpoint:
+                    checkpoint.advance(product_page=page + 1)
+                
+                if processed_products >= total_products:
+                    print(f"Tüm ürünler işlendi. Toplam: {processed_products}")
+                    break
 
         return True
     except Exception as e:
         print(f"Ürünler işlenirken hata: {str(e)}")
+        if checkpoint:
+            checkpoint.save()
         return False
 
-async def fetch_page_products(store_url: str, page: int) -> Optional[Dict]:
+async def prefetch_pages(fetch_page: Callable[[int], Awaitable[Optional[Dict]]], first_page: int, last_page: int, concurrency: int, ready: Optional[Dict[int, Dict]] = None) -> AsyncIterator[Tuple[int, Optional[Dict]]]:
+    """
+    Listeleme sayfalarını sırayla döner, arka planda en fazla `concurrency`
+    istekle önden çeker. Yazıcıdan en fazla 2 * concurrency sayfa ileri gidilir.
+    `ready` içindeki zaten çekilmiş sayfalar tekrar istenmez.
+    """
+    ready = ready or {}
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks: Dict[int, asyncio.Task] = {}
+    next_page = first_page
+
+    async def fetch(page: int) -> Optional[Dict]:
+        async with semaphore:
+            return await fetch_page(page)
+
+    try:
+        for page in range(first_page, last_page + 1):
+            while next_page <= last_page and next_page < page + concurrency * 2:
+                if next_page not in ready:
+                    tasks[next_page] = asyncio.ensure_future(fetch(next_page))
+                next_page += 1
+            if page in ready:
+                yield page, ready.pop(page)
+            else:
+                yield page, await tasks.pop(page)
+    finally:
+        # Yazıcı erken durduysa (limit, hata) bekleyen istekleri iptal et
+        for task in tasks.values():
+            task.cancel()
+
+async def http_get(url: str, headers: Dict, params: Optional[Dict] = None) -> Optional[bytes]:
+    """
+    İsteği havuzdan bir kimlikle (proxy, User-Agent, cookie) gönderir; kimliğin
+    hız limiti dolmuşsa sıradaki hazır kimlik beklenir. 200 dışı yanıtta None döner.
+    """
+    pool = identity_pool(STORE_TYPE, REQUEST_RATE)
+    identity = await pool.acquire()
+    if identity.user_agent is None:
+        # Kimlik başına bir kez seçilir, aynı kimliğin istekleri tutarlı görünür
+        identity.user_agent = random_user_agent()
+    headers = {**headers, 'User-Agent': identity.user_agent}
+    try:
+        async with aiohttp.ClientSession(cookies=identity.cookies) as session:
+            async with session.get(url, headers=headers, params=params, proxy=identity.proxy) as response:
+                if response.status != 200:
+                    pool.record(identity, False, response.status)
+                    print(f"Hata: HTTP {response.status}")
+                    return None
+                body = await response.read()
+                identity.remember_cookies({name: morsel.value for name, morsel in response.cookies.items()})
+    except Exception:
+        pool.record(identity, False)
+        raise
+    pool.record(identity, True)
+    return body
+
+async def fetch_store_page(store_url: str, page: int = 1, with_details: bool = True) -> Optional[Dict]:
+    """
+    Mağazanın listeleme sayfasını indirir ve reduxStore'u bir kez çözer.
+    Aynı HTML'den mağaza detayları ('details') ve ürün listesi ('listing')
+    birlikte döner; sayfada bulunamayan kısım None olur. Redux ağacından
+    yalnızca merchantSearch (ve istenirse merchantDetail) okunur.
+    """
     headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:132.0) Gecko/20100101 Firefox/132.0",
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'tr,en-US;q=0.7,en;q=0.3',
         'Accept-Encoding': 'gzip, deflate, br',
@@ -207,108 +327,173 @@ async def fetch_page_products(store_url: str, page: int) -> Optional[Dict]:
     print(f"Sayfa {page} yükleniyor: {base_url}")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(base_url, headers=headers) as response:
-                if response.status != 200:
-                    print(f"Hata: HTTP {response.status}")
-                    return None
-                    
-                html = await response.text()
+        body = await http_get(base_url, headers)
+        if body is None:
+            return None
+        html = body.decode('utf-8', errors='replace')
                 
-        soup = BeautifulSoup(html, 'html.parser')
         save_to_file(html, "html.txt")  # Save raw HTML
-        redux_store = soup.find('script', {'id': 'reduxStore'})
+        # Script bloğu doğrudan aranır; bulunamazsa HTML ayrıştırılır
+        redux_json = json_codec.find_script(html, 'reduxStore')
+        if redux_json is None:
+            redux_store = BeautifulSoup(html, 'html.parser').find('script', {'id': 'reduxStore'})
+            redux_json = redux_store.string if redux_store else None
 
-        if redux_store:
-            save_to_file(str(redux_store), "redux_store.txt")  # Save redux store content
-        
-        if not redux_store:
+        if redux_json is None:
             print("Redux store bulunamadı")
             return None
 
-        store_data = json.loads(redux_store.string)
-        merchant_search = store_data['merchantState']['merchantSearch']
+        save_to_file(redux_json, "redux_store.txt")  # Save redux store content
 
-        # Check if required fields exist
-        if 'totalProductCount' not in merchant_search or 'products' not in merchant_search:
-            print("Required fields missing in merchant_search")
-            return None
-        
+        paths = ['merchantState.merchantSearch']
+        if with_details:
+            paths.append('merchantState.merchantDetail')
+        extracted = json_codec.extract(redux_json, paths)
+        merchant_state = {
+            'merchantSearch': extracted.get('merchantState.merchantSearch'),
+            'merchantDetail': extracted.get('merchantState.merchantDetail'),
+        }
         return {
-            'totalProductCount': merchant_search['totalProductCount'],
-            'products': merchant_search['products']
+            'details': merchant_details_from(merchant_state) if with_details else None,
+            'listing': product_listing_from(merchant_state)
         }
     except Exception as e:
-        print(store_data['merchantState'])
-        print(f"Sayfa ürünleri alınırken hata: {str(e)}")
+        print(f"Mağaza sayfası alınırken hata: {str(e)}")
         return None
 
-async def save_product(product: Dict, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits) -> None:
-    try:
-        directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
-        products_collection = directus.collection('products')
-        
-        # Ürün eklenebilir mi kontrol et
-        if not subscription_limits.can_add_product():
+async def fetch_page_products(store_url: str, page: int) -> Optional[Dict]:
+    store_page = await fetch_store_page(store_url, page, with_details=False)
+    return store_page['listing'] if store_page else None
+
+def transform_product_for_directus(product: Dict, store_id: str, store_data: Dict) -> ProductRecord:
+    """Listeleme sayfasındaki ürünü Directus formatına dönüştürür"""
+    return ProductRecord(
+        product_id=str(product['productId']),
+        sku=str(product['sku']),
+        name=product['name'],
+        description='',
+        price=float(product['price'][0]['value']),
+        category=product['categoryName'],
+        store=store_id,
+        user=store_data.get('user'),
+        images=[img['linkFormat'].replace('{size}', '1200') for img in product['images']],
+        url=f"https://www.hepsiburada.com{product['productUrl']}",
+        store_type=STORE_TYPE,
+        status='published',
+        extra=encode_extra(project({
+            'brand': product['brandName'],
+            'rating': product['rating'],
+            'merchant_id': str(product['merchantId']),
+            'merchant_name': product['merchantName'],
+            'category_id': str(product['categoryId'])
+        }, extra_fields_for(STORE_TYPE, 'product')))
+    )
+
+async def bulk_save_products(products: List[Dict], store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits, loader: BulkLoader) -> bool:
+    """Bir sayfa ürünü doğrudan Postgres'e yazar; limit dolduysa False döner"""
+    rows = []
+    limit_reached = False
+    for product in products:
+        if not subscription_limits.add_product():
             print(f"Ürün limiti aşıldı. Maksimum: {subscription_limits.product_limit}")
-            return False
+            limit_reached = True
+            break
+        try:
+            rows.append(transform_product_for_directus(product, store_id, store_data))
+        except Exception as e:
+            subscription_limits.added_products -= 1
+            print(f"Ürün dönüştürülürken hata: {str(e)}")
 
-        product_data = {
-            'product_id': str(product['productId']),
-            'sku': str(product['sku']),
-            'name': product['name'],
-            'description': '',
-            'price': float(product['price'][0]['value']),
-            'category': product['categoryName'],
-            'store': store_id,
-            'user': store_data.get('user'),
-            'images': [img['linkFormat'].replace('{size}', '1200') for img in product['images']],
-            'url': f"https://www.hepsiburada.com{product['productUrl']}",
-            'store_type': STORE_TYPE,
-            'status': 'published',
-            'extra_fields': {
-                'brand': product['brandName'],
-                'rating': product['rating'],
-                'merchant_id': str(product['merchantId']),
-                'merchant_name': product['merchantName'],
-                'category_id': str(product['categoryId'])
-            }
-        }
-        
-        # Ürünün zaten var olup olmadığını kontrol et
-        existing_product = await products_collection.filter(
-            (F(sku=product_data['sku']) & F(store=store_id)) | 
-            (F(product_id=product_data['product_id']) & F(store=store_id))
-        ).read()
-        
-        if existing_product.items:
-            # Ürün varsa güncelle
-            updated_product = await products_collection.update(
-                existing_product.items[0]['id'], 
-                product_data
+    await loader.upsert_products(rows)
+    print(f"{len(rows)} ürün toplu yazıldı")
+    return not limit_reached
+
+async def save_products(products: List[Dict], store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits) -> bool:
+    """
+    Bir sayfa ürünü Directus'a ekler veya günceller; mevcut ürünler tek sorguda
+    bulunur, yazmalar write scheduler üzerinden gider. Limit dolduysa False döner.
+    """
+    directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
+
+    # Ürün eklenebilir mi kontrol et (yazılamayanlar aşağıda sayaçtan düşülür)
+    rows = {}
+    limit_reached = False
+    for product in products:
+        if not subscription_limits.add_product():
+            print(f"Ürün limiti aşıldı. Maksimum: {subscription_limits.product_limit}")
+            limit_reached = True
+            break
+        try:
+            product_data = transform_product_for_directus(product, store_id, store_data)
+        except Exception as e:
+            subscription_limits.added_products -= 1
+            print(f"Ürün dönüştürülürken hata: {str(e)}")
+            continue
+        sku_key = product_key(STORE_TYPE, store_id, product_data.sku)
+        if sku_key in rows:
+            subscription_limits.added_products -= 1
+        rows[sku_key] = product_data
+
+    # Ürünlerin zaten var olup olmadığını kontrol et (önce identity cache)
+    existing_ids = await identity_cache.get_many('product_sku', list(rows))
+    learned_ids = {}
+    missing = [product_data for sku_key, product_data in rows.items() if sku_key not in existing_ids]
+    if missing:
+        existing_products = await read(directus.collection('products').filter(
+            F(store=store_id) & (
+                F(sku__in=[product_data.sku for product_data in missing]) |
+                F(product_id__in=[product_data.product_id for product_data in missing])
             )
-            print(f"Ürün güncellendi: {product_data['name']}")
+        ).fields('id', 'sku', 'product_id').limit(-1).read, 'products')
+        by_sku, by_product_id = {}, {}
+        for item in existing_products.items or []:
+            by_sku.setdefault(str(item['sku']), item['id'])
+            by_product_id.setdefault(str(item['product_id']), item['id'])
+        for product_data in missing:
+            existing_id = by_sku.get(product_data.sku, by_product_id.get(product_data.product_id))
+            if existing_id is not None:
+                learned_ids[product_key(STORE_TYPE, store_id, product_data.sku)] = existing_id
+        existing_ids.update(learned_ids)
+
+    updates = [(sku_key, product_data) for sku_key, product_data in rows.items() if sku_key in existing_ids]
+    new_rows = [(sku_key, product_data) for sku_key, product_data in rows.items() if sku_key not in existing_ids]
+
+    # Ürün varsa güncelle
+    results = await write_scheduler.update(
+        directus, 'products', [(existing_ids[sku_key], product_data) for sku_key, product_data in updates]
+    )
+    failed_keys = []
+    for (sku_key, product_data), ok in zip(updates, results):
+        if ok:
+            print(f"Ürün güncellendi: {product_data.name}")
         else:
-            # Ürün yoksa yeni ekle
-            created_product = await products_collection.create(product_data)
-            print(f"Yeni ürün eklendi: {product_data['name']}")
-        
-        # Başarılı kayıt sonrası sayacı artır
-        subscription_limits.add_product()
-            
-    except Exception as e:
-        print(f"Ürün kaydedilirken hata: {str(e)}")
-        print(f"Ürün verisi: {product_data}")
+            # Cache'teki id silinmiş bir ürüne ait olabilir, sonraki sefer yeniden okunur
+            failed_keys.append(sku_key)
+            learned_ids.pop(sku_key, None)
+    await identity_cache.invalidate('product_sku', failed_keys)
+
+    # Ürün yoksa yeni ekle
+    created = await write_scheduler.create(directus, 'products', [product_data for _, product_data in new_rows])
+    for (sku_key, product_data), item in zip(new_rows, created):
+        if item is None:
+            failed_keys.append(sku_key)
+            continue
+        if item.get('id') is not None:
+            learned_ids[sku_key] = item['id']
+        print(f"Yeni ürün eklendi: {product_data.name}")
+
+    subscription_limits.added_products -= len(failed_keys)
+    await identity_cache.set_many('product_sku', learned_ids)
+    return not limit_reached
 
 async def fetch_product_reviews(sku: str, from_index: int = 0, size: int = 100) -> Optional[Dict]:
     """Ürün yorumlarını çeken fonksiyon"""
     headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:132.0) Gecko/20100101 Firefox/132.0",
         'Accept': 'application/json',
         'Accept-Language': 'tr,en-US;q=0.7,en;q=0.3',
     }
     
-    url = f"https://user-content-gw-hermes.hepsiburada.com/queryapi/v2/ApprovedUserContents"
+    url = f"{HEPSIBURADA_REVIEWS_API_URL}/queryapi/v2/ApprovedUserContents"
     params = {
         "skuList": sku,
         "from": from_index,
@@ -316,101 +501,127 @@ async def fetch_product_reviews(sku: str, from_index: int = 0, size: int = 100)
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status != 200:
-                    print(f"Hata: HTTP {response.status}")
-                    return None
-                    
-                return await response.json()
+        body = await http_get(url, headers, params)
+        return json_codec.loads(body) if body is not None else None
     except Exception as e:
         print(f"Yorumlar alınırken hata: {str(e)}")
         return None
 
+def transform_reviews_for_directus(reviews: List[Dict], product_id: str, store_id: str, store_data: Dict) -> List[ReviewRecord]:
+    """Bir sayfa Hepsiburada yorumunu Directus formatına dönüştürür (ağ erişimi yok)"""
+    # İçeriği boş yorumlar atlanır
+    reviews = [review for review in reviews if review.get('review', {}).get('content')]
+
+    ratings = [float(review['star']) for review in reviews]
+    review_dates, review_created_dates = iso_strings_to_dates([review['createdAt'] for review in reviews])
+    review_sentiments = sentiments(ratings)
+    user = store_data.get('user')
+    extra_fields = extra_fields_for(STORE_TYPE, 'review')
+
+    rows = []
+    for review, rating, review_date, review_created_date, sentiment in zip(
+        reviews, ratings, review_dates, review_created_dates, review_sentiments
+    ):
+        merchant_name = 'Bilinmiyor'
+        if review.get('order') is not None:
+            merchant_name = review['order'].get('merchant', 'Bilinmiyor')
+
+        rows.append(ReviewRecord(
+            review_target_id=f"{STORE_TYPE}_{str(review['id'])}",
+            content=review['review']['content'],
+            rating=rating,
+            review_date=review_date,
+            review_created_date=review_created_date,
+            source='hepsiburada',
+            sentiment=sentiment,
+            product=product_id,
+            status='published',
+            store_id=store_id,
+            user=user,
+            # customer ve media varsayılan olarak yazılmaz (bkz. field_projection)
+            extra=encode_extra(project({
+                'customer': review['customer'],
+                'isPurchaseVerified': bool(review['isPurchaseVerified']),
+                'media': review['media'],
+                'merchant': merchant_name,
+            }, extra_fields))
+        ))
+    return rows
+
 async def save_reviews(reviews: List[Dict], product_id: str, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits):
     try:
         directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
-        
-        for review in reviews:
-            # Yorum eklenebilir mi kontrol et
-            if not subscription_limits.can_add_review():
+
+        archive_raw(STORE_TYPE, store_id, 'reviews', reviews)
+
+        # Önce sayfanın tamamını dönüştür, sonra tek sorguda mevcut yorumları bul
+        review_rows = transform_reviews_for_directus(reviews, product_id, store_id, store_data)
+        if len(review_rows) < len(reviews):
+            print(f"{len(reviews) - len(review_rows)} boş yorum atlandı")
+
+        # Toplu yazmada güncelleme ON CONFLICT ile yapılır, mevcut yorumlara bakmaya gerek yok
+        loader = await get_bulk_loader()
+        if loader:
+            existing_ids = {}
+        else:
+            existing_ids = await fetch_existing_review_ids(directus, [row.review_target_id for row in review_rows])
+
+        new_rows = []
+        updates = []
+        for review_data in review_rows:
+            # Yorum eklenebilir mi kontrol et (yazılamayanlar aşağıda sayaçtan düşülür)
+            if not subscription_limits.add_review():
                 subscription_limits.added_reviews = subscription_limits.review_limit
                 print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
                 break
-                
-            # İçerik kontrolü
-            if not review.get('review', {}).get('content'):
-                print("Boş yorum içeriği, atlaniyor...")
-                continue
-                
-            review_date = datetime.fromisoformat(review['createdAt'].split('+')[0])
-            
-            # Sentiment hesaplama
-            rating = review['star']
-            if rating >= 4:
-                sentiment = 'positive'
-            elif rating == 3:
-                sentiment = 'neutral'
-            else:
-                sentiment = 'negative'
-                
-
-            # review_target_id'yi oluştur
-            review_target_id = f"{STORE_TYPE}_{str(review['id'])}"
-
-            merchant_name = 'Bilinmiyor'
-            if review.get('order') is not None:
-                merchant_name = review['order'].get('merchant', 'Bilinmiyor')
-
-            review_data = {
-                'review_target_id': review_target_id,
-                'content': review['review']['content'],
-                'rating': float(review['star']),
-                'review_date': review_date.strftime('%Y-%m-%d'),
-                'review_created_date': review_date.isoformat(),
-                'source': 'hepsiburada',
-                'sentiment': sentiment,
-                'product': product_id,
-                'status': 'published',
-                'store_id': store_id,
-                'user': store_data.get('user'),
-                'extra_fields': {
-                    'customer': review['customer'],
-                    'isPurchaseVerified': bool(review['isPurchaseVerified']),
-                    'media': review['media'],
-                    'merchant': merchant_name,
-                }
-            }
-            
-            reviews_collection = directus.collection('reviews')
 
-            # Review'in var olup olmadığını kontrol et
-            # print(f"Yorum aranıyor - Review Target ID: {review_target_id}")
-            existing_review = await reviews_collection.filter(
-                F(review_target_id=review_target_id)
-            ).read()
-            
-            
-            if existing_review.items:
-                await reviews_collection.update(existing_review.items[0]['id'], review_data)
-                print(f"Yorum güncellendi: {review_data['review_target_id']}")
+            existing_id = existing_ids.get(review_data.review_target_id)
+            if existing_id is not None:
+                updates.append((existing_id, review_data))
             else:
-                await reviews_collection.create(review_data)
-                print(f"Yeni yorum eklendi: {review_data['review_target_id']}")
+                new_rows.append(review_data)
+
+        if updates:
+            results = await write_scheduler.update(directus, 'reviews', updates)
+            failed = [review_data.review_target_id for (_, review_data), ok in zip(updates, results) if not ok]
+            subscription_limits.added_reviews -= len(failed)
+            await identity_cache.invalidate('review', failed)
+            print(f"{len(updates) - len(failed)} yorum güncellendi")
 
-            # Başarılı kayıt sonrası sayacı artır
-            subscription_limits.add_review()
+        if new_rows:
+            try:
+                if loader:
+                    await loader.upsert_reviews(new_rows)
+                else:
+                    # Yazılamayanlar dead-letter'a düştü, replay'de eklenecek
+                    created = await write_scheduler.create(directus, 'reviews', new_rows)
+                    subscription_limits.added_reviews -= created.count(None)
+                    await remember_created('review', new_rows, 'review_target_id', created)
+                print(f"{len(new_rows)} yeni yorum eklendi")
+            except DirectusUnavailable:
+                raise
+            except Exception:
+                subscription_limits.added_reviews -= len(new_rows)
+                raise
                 
+    except DirectusUnavailable:
+        raise
     except Exception as e:
+        # Directus'a ulaşılamadıysa sayfa atlanmaz: import yarıda kalır ve checkpoint'ten devam eder
+        if is_transient(e) or isinstance(e, DirectusException):
+            raise
         print(f"Yorumlar kaydedilirken hata: {str(e)}")
 
-async def fetch_all_reviews(sku: str, product_id: str, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits):
+async def fetch_all_reviews(sku: str, product_id: str, store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits, from_index: int = 0, checkpoint: Optional[ImportCheckpoint] = None):
     """Tüm yorumları çeken ve kaydeden fonksiyon"""
-    from_index = 0
     size = 100
+    upstream_id = upstream_key(store_data)[1]
     
     while True:
-        response = await fetch_product_reviews(sku, from_index, size)
+        response = await shared_fetch_cache.aget_or_fetch(
+            STORE_TYPE, upstream_id, f"reviews:{sku}:{from_index}:{size}",
+            lambda: fetch_product_reviews(sku, from_index, size)
+        )
         if not response:
             break
             
@@ -425,52 +636,84 @@ async def fetch_all_reviews(sku: str, product_id: str, store_id: str, store_data
             break
             
         from_index += size
-        # Rate limiting
-        await asyncio.sleep(1)
+        if checkpoint:
+            checkpoint.advance(review_from=from_index)
 
-async def process_all_reviews(store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits) -> None:
+async def process_all_reviews(store_id: str, store_data: Dict, subscription_limits: SubscriptionLimits, checkpoint: Optional[ImportCheckpoint] = None) -> None:
     """Mağazadaki tüm ürünlerin yorumlarını çeken fonksiyon"""
     try:
         print("Tüm ürünlerin yorumları çekiliyor...")
         directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
-        products_collection = directus.collection('products')
+        store_products = F(store=store_id) & F(store_type=STORE_TYPE)
         
-        # Mağazaya ait tüm ürünleri getir
-        products = await products_collection.filter(
-            F(store=store_id) & F(store_type=STORE_TYPE)
-        ).read()
-        
-        total_products = len(products.items)
+        total_products = await count_items(directus, 'products', store_products)
         print(f"Toplam {total_products} ürün için yorumlar çekilecek")
-        
-        for idx, product in enumerate(products.items, 1):
-            # Yorum limiti kontrolü
-            if not subscription_limits.can_add_review():
-                subscription_limits.added_reviews = subscription_limits.review_limit
-                print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
-                print("Yorum çekme işlemi sonlandırılıyor...")
-                return
-                
-            print(f"Ürün yorumları çekiliyor ({idx}/{total_products}): {product['name']}")
-            print(store_id)
-
-            # Her ürünün yorumlarını çek
-            await fetch_all_reviews(
-                sku=product['sku'],
-                product_id=product['id'],
-                store_id=store_id,
-                store_data=store_data,
-                subscription_limits=subscription_limits
-            )
-            
-            # Her 5 üründe bir bekleme yap
-            if idx % 5 == 0:
-                await asyncio.sleep(2)
+
+        # Ürünler id sırasıyla akış halinde okunur (Directus'un varsayılan limitine takılmadan);
+        # checkpoint yorumları tamamlanan son ürünün id'sini tutar
+        start_index = checkpoint.get('sku_index', 0) if checkpoint else 0
+        last_product_id = checkpoint.get('last_product_id') if checkpoint else None
+        if last_product_id is not None:
+            print(f"Yorum import'una {start_index + 1}. üründen devam ediliyor")
+        else:
+            start_index = 0
+
+        products = iter_collection(
+            directus, 'products', store_products, fields=('id', 'sku'), after_id=last_product_id
+        )
+        # Ürünler havuzdaki kimlik sayısı kadar paralel işlenir; checkpoint yalnızca
+        # kesintisiz tamamlanan ürünlere kadar ilerler (yarım kalan ürün baştan alınır)
+        concurrency = REVIEW_CONCURRENCY or len(identity_pool(STORE_TYPE, REQUEST_RATE))
+        pending: Dict[int, Tuple[str, asyncio.Task]] = {}
+
+        async def complete(limit: int) -> None:
+            while len(pending) > limit:
+                oldest = min(pending)
+                product_id, task = pending.pop(oldest)
+                await task
+                if checkpoint:
+                    checkpoint.advance(sku_index=oldest, last_product_id=product_id, review_from=0)
+
+        idx = start_index
+        try:
+            async for product in products:
+                idx += 1
+                # Yorum limiti kontrolü
+                if not subscription_limits.can_add_review():
+                    subscription_limits.added_reviews = subscription_limits.review_limit
+                    print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
+                    print("Yorum çekme işlemi sonlandırılıyor...")
+                    await complete(0)
+                    return
+
+                print(f"Ürün yorumları çekiliyor ({idx}/{total_products}): {product['sku']}")
+                print(store_id)
+
+                # Her ürünün yorumlarını çek (istek hızı kimlik havuzunda sınırlanır)
+                pending[idx] = (product['id'], asyncio.create_task(fetch_all_reviews(
+                    sku=product['sku'],
+                    product_id=product['id'],
+                    store_id=store_id,
+                    store_data=store_data,
+                    subscription_limits=subscription_limits,
+                    from_index=checkpoint.get('review_from', 0) if checkpoint and idx == start_index + 1 else 0,
+                    checkpoint=checkpoint if concurrency == 1 else None
+                )))
+                await complete(concurrency - 1)
+
+            await complete(0)
+        finally:
+            for _, task in pending.values():
+                task.cancel()
                 
         print("Tüm ürünlerin yorumları çekildi")
         
     except Exception as e:
         print(f"Yorumlar işlenirken hata: {str(e)}")
+        # İlerlemeyi yazıp hatayı yukarı ilet, mağaza bir sonraki çalışmada devam etsin
+        if checkpoint:
+            checkpoint.save()
+            raise
 
 async def update_import_status(store_id: str, status: str) -> None:
     try:
@@ -1,15 +1,42 @@
 import requests
 import os
 import json
+import asyncio
+import contextlib
+import threading
 import cloudscraper
-from datetime import datetime
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 from py_directus import Directus, F
 from subscription_manager import initialize_subscription_limits, update_subscription_usage, SubscriptionLimits
-from fake_useragent import UserAgent
+from checkpoint import ImportCheckpoint
+from fetch_cache import shared_fetch_cache
+from review_transform import epoch_ms_to_dates, sentiments
+from directus_lookup import fetch_product_ids, fetch_existing_review_ids, load_product_index, remember_created
+from identity_cache import identity_cache, product_key
+from field_projection import extra_fields_for, project, archive_raw
+from records import ProductRecord, ReviewRecord, encode_extra
+import json_codec
+from bulk_loader import get_bulk_loader, invalidate_directus_cache
+from directus_writer import DirectusUnavailable, read
+from write_scheduler import write_scheduler
+from identity_pool import Identity, identity_pool, random_user_agent
 
 # Global variables
 STORE_TYPE = 'trendyol'
+TRENDYOL_API_URL = os.getenv("TRENDYOL_API_URL", "https://api.trendyol.com")
+TRENDYOL_REVIEWS_API_URL = os.getenv("TRENDYOL_REVIEWS_API_URL", "https://apigw.trendyol.com")
+# Ana kolonlara eşlenen alanlar extra_fields'e tekrar yazılmaz
+MAPPED_PRODUCT_FIELDS = ("productContentId", "stockCode", "title", "description", "salePrice",
+                         "categoryName", "approved", "archived", "productUrl", "images")
+MAPPED_REVIEW_FIELDS = ("contentId", "comment", "rate", "createdDate")
+# Bir kimliğin yorum istekleri arasındaki en kısa süre (saniye), benchmark'ta 0 yapılabilir;
+# toplam hız identity_pool'daki kimlik sayısıyla artar
+REQUEST_DELAY = float(os.getenv("TRENDYOL_REQUEST_DELAY", "1"))
+REQUEST_RATE = 1 / REQUEST_DELAY if REQUEST_DELAY > 0 else 0
+# Thread başına kimlik adı -> cloudscraper oturumu (requests Session'ı thread-safe değil)
+_scrapers = threading.local()
+_user_agent_lock = threading.Lock()
 
 def fetch_store_data(store_id: str, token_key: str, page: int = 0, approved: bool = True, size: int = 50) -> dict:
     """
@@ -25,7 +52,7 @@ def fetch_store_data(store_id: str, token_key: str, page: int = 0, approved: boo
     Returns:
         dict: API response data
     """
-    url = f'https://api.trendyol.com/sapigw/suppliers/{store_id}/products'
+    url = f'{TRENDYOL_API_URL}/sapigw/suppliers/{store_id}/products'
     
     headers = {
         'Authorization': f'Basic {token_key}',
@@ -41,7 +68,7 @@ def fetch_store_data(store_id: str, token_key: str, page: int = 0, approved: boo
     response = requests.get(url, headers=headers, params=params)
     response.raise_for_status()
     
-    return response.json()
+    return json_codec.loads(response.content)
 
 def fetch_all_store_data(store_id: str, token_key: str, approved: bool = True, size: int = 50) -> list:
     """
@@ -57,10 +84,34 @@ def fetch_all_store_data(store_id: str, token_key: str, approved: bool = True, s
         list: All products from all pages
     """
     all_products = []
-    current_page = 0
+
+    for _, products in iter_store_pages(store_id, token_key, approved=approved, size=size):
+        all_products.extend(products)
+    
+    return all_products
+
+def iter_store_pages(store_id: str, token_key: str, start_page: int = 0, approved: bool = True, size: int = 50) -> Iterator[Tuple[int, list]]:
+    """
+    Yield store product pages from Trendyol API one by one
+    
+    Args:
+        store_id (str): Store ID for Trendyol
+        token_key (str): Authorization token key
+        start_page (int): Page to start from (used when resuming)
+        approved (bool): Filter for approved products
+        size (int): Number of items per page
+        
+    Yields:
+        tuple: (page number, products of that page)
+    """
+    current_page = start_page
     
     while True:
-        response = fetch_store_data(store_id, token_key, current_page, approved, size)
+        # Aynı Trendyol mağazasına bağlı diğer mağazalarla paylaşılır
+        response = shared_fetch_cache.get_or_fetch(
+            STORE_TYPE, str(store_id), f"products:{current_page}:{approved}:{size}",
+            lambda: fetch_store_data(store_id, token_key, current_page, approved, size)
+        )
         #print("API Yanıt Yapısı:", json.dumps(response, indent=2, ensure_ascii=False))
         
         if 'content' not in response:
@@ -68,16 +119,14 @@ def fetch_all_store_data(store_id: str, token_key: str, approved: bool = True, s
             print("Tam API yanıtı:", response)
             break
             
-        all_products.extend(response['content'])
+        yield current_page, response['content']
         
         if current_page >= response['totalPages'] - 1:
             break
             
         current_page += 1
-    
-    return all_products
 
-def transform_product_for_directus(product: dict, directus_store_id: str) -> dict:
+def transform_product_for_directus(product: dict, directus_store_id: str) -> ProductRecord:
     """
     Trendyol ürün verisini Directus formatına dönüştürür.
     """
@@ -87,27 +136,22 @@ def transform_product_for_directus(product: dict, directus_store_id: str) -> dic
 
     try:
         # Ana alanları eşleştir
-        directus_product = {
-            "product_id": str(product.get('productContentId', '')),
-            "sku": str(product.get("stockCode", '')),
-            "name": product.get("title", ''),
-            "description": product.get("description", ''),
-            "price": float(product.get("salePrice", 0)),
-            "category": product.get("categoryName", ''),
-            "status": "published" if product.get("approved", False) and not product.get("archived", True) else "draft",
-            "sort": None,
-            "store": directus_store_id,
-            "url": product.get("productUrl", ''),
-            "images": [img.get("url", '') for img in product.get("images", [])],
-            "store_type": "trendyol",
-            "extra_fields": {}
-        }
-        
-        # Kalan tüm alanları extra_fields'e ekle
-        for key, value in product.items():
-            if key not in ["productCode", "stockCode", "title", "description", "salePrice", 
-                          "categoryName", "approved", "archived", "productUrl", "images"]:
-                directus_product["extra_fields"][key] = value
+        directus_product = ProductRecord(
+            product_id=str(product.get('productContentId', '')),
+            sku=str(product.get("stockCode", '')),
+            name=product.get("title", ''),
+            description=product.get("description", ''),
+            price=float(product.get("salePrice", 0)),
+            category=product.get("categoryName", ''),
+            status="published" if product.get("approved", False) and not product.get("archived", True) else "draft",
+            sort=None,
+            store=directus_store_id,
+            url=product.get("productUrl", ''),
+            images=[img.get("url", '') for img in product.get("images", [])],
+            store_type="trendyol",
+            # Sadece whitelist'teki ek alanlar (bkz. field_projection)
+            extra=encode_extra(project(product, extra_fields_for(STORE_TYPE, 'product'), exclude=MAPPED_PRODUCT_FIELDS))
+        )
                 
         return directus_product
         
@@ -131,6 +175,7 @@ async def parse_store(store_data):
     if api_info:
         try:
             print(f"Processing with API credentials: {api_info['store_id']}")
+            checkpoint = ImportCheckpoint.load(store_data['id'])
             
             # Başlangıçta limitleri al
             directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
@@ -143,47 +188,65 @@ async def parse_store(store_data):
                 print("Paket bilgisi bulunamadı")
                 return False
 
-            # Ürünleri çek
-            all_products = fetch_all_store_data(
-                store_id=api_info['store_id'],
-                token_key=api_info['token_key'],
-            )
+            processed_products = 0
 
-            print(f"Total products fetched: {len(all_products)}")
-            
-            
-            # Ürünleri Directus formatına dönüştür
-            directus_products = [
-                transform_product_for_directus(product, store_data['id']) 
-                for product in all_products
-            ]
-
-            #print("Tüm Ürünler:", directus_products)
-            print(f"Total products transformed: {len(directus_products)}")
-            
-            
-            # Ürünleri Directus'a ekle
-            processed_products = await add_products_to_directus(directus_products, store_data, subscription_limits)
-            print(f"Total products processed: {len(processed_products)}")
+            if not checkpoint.get('products_done'):
+                # Ürünleri sayfa sayfa çek, dönüştür ve Directus'a ekle
+                for page, products in iter_store_pages(
+                    store_id=api_info['store_id'],
+                    token_key=api_info['token_key'],
+                    start_page=checkpoint.get('product_page', 0),
+                ):
+                    archive_raw(STORE_TYPE, store_data['id'], 'products', products)
+                    directus_products = [
+                        transform_product_for_directus(product, store_data['id']) 
+                        for product in products
+                    ]
+                    # Ham sayfa ve dönüştürülmüş ürünler sayfa bittiğinde bırakılır, sadece sayı tutulur
+                    processed_products += await add_products_to_directus(directus_products, store_data, subscription_limits)
+                    del products, directus_products
+                    checkpoint.advance(product_page=page + 1)
+
+                    if not subscription_limits.can_add_product():
+                        break
+
+                checkpoint.advance(products_done=True)
+                checkpoint.save()
+                print(f"Total products processed: {processed_products}")
 
-            # Yorumları çek ve ekle
-            raw_reviews = fetch_all_store_reviews(
+            # Yorumları ürünlere eşlemek için mağazanın ürün indeksi bir kez, akış halinde okunur
+            await invalidate_directus_cache()
+            product_index = await load_product_index(directus, STORE_TYPE, store_data['id'])
+            print(f"Product index loaded: {len(product_index)} products")
+
+            # Yorumları sayfa sayfa çek ve ekle (limit dolunca bekleyen prefetch'ler hemen bırakılır)
+            review_pages = iter_store_review_pages(
                 store_id=api_info['store_id'],
-                token_key=api_info['token_key']
+                token_key=api_info['token_key'],
+                start_page=checkpoint.get('review_page', 0),
             )
-            print(f"Total reviews fetched: {len(raw_reviews)}")
-            
-            # Yorumları Directus'a ekle
-            await add_reviews_to_directus(raw_reviews, store_data, subscription_limits)
+            async with contextlib.aclosing(review_pages):
+                async for page, raw_reviews in review_pages:
+                    print(f"Reviews fetched on page {page}: {len(raw_reviews)}")
+                    archive_raw(STORE_TYPE, store_data['id'], 'reviews', raw_reviews)
+                    await add_reviews_to_directus(raw_reviews, store_data, subscription_limits, product_index)
+                    del raw_reviews
+                    checkpoint.advance(review_page=page + 1)
+
+                    if not subscription_limits.can_add_review():
+                        break
             
             # İşlem sonunda kullanım istatistiklerini güncelle
             await update_subscription_usage(directus, user_id, subscription_limits)
-            
-            return processed_products
+
+            checkpoint.clear()
+            return True
 
         except Exception as e:
             print(f"Error in parse_store: {str(e)}")
-            return []
+            # Bir sonraki denemede kaldığı yerden devam edebilmek için ilerlemeyi yaz
+            checkpoint.save()
+            raise
 
     return True
 
@@ -200,20 +263,15 @@ def fetch_store_reviews(store_id: str, token_key: str, page: int = 0, size: int
     Returns:
         dict: API response data with reviews
     """
-    ua = UserAgent()
-    scraper = cloudscraper.create_scraper(
-        browser={
-            'browser': 'chrome',
-            'platform': 'windows',
-            'desktop': True
-        }
-    )
+    pool = identity_pool(STORE_TYPE, REQUEST_RATE)
+    identity = pool.acquire_sync()
+    scraper = scraper_for(identity)
 
     # API çağrısı yapmak için headers ve params
-    url = f'https://apigw.trendyol.com/discovery-sellerstore-webgw-service/v1/ugc/product-reviews/reviews/{store_id}'
+    url = f'{TRENDYOL_REVIEWS_API_URL}/discovery-sellerstore-webgw-service/v1/ugc/product-reviews/reviews/{store_id}'
     # API isteği için headers
     api_headers = {
-        'User-Agent': ua.random,
+        'User-Agent': identity.user_agent,
         'Accept': 'application/json',
         'Referer': 'https://www.trendyol.com/',
         'Origin': 'https://www.trendyol.com',
@@ -227,12 +285,43 @@ def fetch_store_reviews(store_id: str, token_key: str, page: int = 0, size: int
         'channelId': 1
     }
 
-    # Requests ile API çağrısı
-    response = scraper.get(url, headers=api_headers, params=params)
+    # Requests ile API çağrısı (kimliğin proxy'si ve cookie'leriyle)
+    try:
+        response = scraper.get(url, headers=api_headers, params=params, proxies=identity.proxies)
+    except requests.RequestException:
+        pool.record(identity, False)
+        raise
+    pool.record(identity, response.ok, response.status_code)
+    # Aynı kimliğin diğer thread'lerdeki oturumları da bu cookie'lerle başlar
+    identity.remember_cookies(scraper.cookies.get_dict())
     response.raise_for_status()
-    return response.json()
+    return json_codec.loads(response.content)
+
+def scraper_for(identity: Identity) -> cloudscraper.CloudScraper:
+    """
+    Kimlik ve thread başına bir scraper; prefetch thread'leri oturum paylaşmaz.
+    Cloudflare ve site cookie'leri kimlikte saklanır, yeni oturumlar onlarla başlar.
+    """
+    scrapers = getattr(_scrapers, 'by_identity', None)
+    if scrapers is None:
+        scrapers = _scrapers.by_identity = {}
+    if identity.name not in scrapers:
+        with _user_agent_lock:
+            if identity.user_agent is None:
+                # Kimlik başına bir kez seçilir, aynı kimliğin istekleri tutarlı görünür
+                identity.user_agent = random_user_agent()
+        scraper = cloudscraper.create_scraper(
+            browser={
+                'browser': 'chrome',
+                'platform': 'windows',
+                'desktop': True
+            }
+        )
+        scraper.cookies.update(identity.cookies)
+        scrapers[identity.name] = scraper
+    return scrapers[identity.name]
 
-def fetch_all_store_reviews(store_id: str, token_key: str, size: int = 1000) -> List[Dict[str, Any]]:
+async def fetch_all_store_reviews(store_id: str, token_key: str, size: int = 1000) -> List[Dict[str, Any]]:
     """
     Fetch all pages of store reviews from Trendyol API
     
@@ -245,151 +334,249 @@ def fetch_all_store_reviews(store_id: str, token_key: str, size: int = 1000) ->
         list: All reviews from all pages
     """
     all_reviews = []
-    current_page = 0
-    
-    while True:
-        response = fetch_store_reviews(store_id, token_key, current_page, size)
-        
-        # Extract reviews from nested structure
-        reviews_data = response.get('productReviews', {})
-        
-        current_reviews = reviews_data.get('content', [])
+
+    async for _, current_reviews in iter_store_review_pages(store_id, token_key, size=size):
         all_reviews.extend(current_reviews)
 
         print(f"Total reviews fetched: {len(all_reviews)}")
-        
-        total_pages = reviews_data.get('totalPages', 0)
-        print(f"Total pages: {total_pages}")
-        if current_page >= total_pages - 1:
-            break
-            
-        current_page += 1
     
     return all_reviews
 
-async def add_products_to_directus(products: List[Dict], store_data: Dict, subscription_limits: SubscriptionLimits):
+async def iter_store_review_pages(store_id: str, token_key: str, start_page: int = 0, size: int = 1000) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield store review pages from Trendyol API one by one.
+    Requests (and rate limit waits) run in threads, the event loop is not blocked.
+    
+    Args:
+        store_id (str): Store ID for Trendyol
+        token_key (str): Authorization token key
+        start_page (int): Page to start from (used when resuming)
+        size (int): Number of items per page
+        
+    Yields:
+        tuple: (page number, reviews of that page)
+    """
+    def fetch_page(page: int) -> Dict[str, Any]:
+        return shared_fetch_cache.get_or_fetch(
+            STORE_TYPE, str(store_id), f"reviews:{page}:{size}",
+            lambda: fetch_store_reviews(store_id, token_key, page, size)
+        )
+
+    # Havuzda birden fazla kimlik varsa sonraki sayfalar onlarla paralel çekilir
+    concurrency = len(identity_pool(STORE_TYPE, REQUEST_RATE))
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    pending = {}
+    current_page = start_page
+    response = await asyncio.to_thread(fetch_page, current_page)
+
+    try:
+        while True:
+            # Extract reviews from nested structure
+            reviews_data = response.get('productReviews', {})
+            total_pages = reviews_data.get('totalPages', 0)
+
+            if executor:
+                for page in range(current_page + 1, min(total_pages, current_page + concurrency)):
+                    if page not in pending:
+                        pending[page] = executor.submit(fetch_page, page)
+
+            yield current_page, reviews_data.get('content', [])
+
+            print(f"Review page {current_page + 1}/{total_pages}")
+            if current_page >= total_pages - 1:
+                break
+
+            current_page += 1
+            # Önceki sayfa (1000 yorum) sonraki sayfa beklenirken bellekte kalmasın
+            response = reviews_data = None
+            future = pending.pop(current_page, None)
+            response = await (asyncio.wrap_future(future) if future else asyncio.to_thread(fetch_page, current_page))
+    finally:
+        if executor:
+            # Süren istekler arka planda biter, event loop beklemez
+            executor.shutdown(wait=False, cancel_futures=True)
+
+async def add_products_to_directus(products: List[ProductRecord], store_data: Dict, subscription_limits: SubscriptionLimits) -> int:
     """
-    Ürünleri Directus'a ekler veya günceller
+    Ürünleri Directus'a ekler veya günceller, yazılan ürün sayısını döner
     """
     directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
     
     processed_products = []
 
     print(f"Adding/Updating products in Directus: {len(products)}")
+
+    loader = await get_bulk_loader()
+    if loader:
+        # Toplu yazma: sayfadaki ürünler tek COPY + upsert ile yazılır
+        for product in products:
+            if not subscription_limits.add_product():
+                print(f"Ürün limiti aşıldı. Maksimum: {subscription_limits.product_limit}")
+                break
+            product.user = store_data.get('user')
+            processed_products.append(product)
+        await loader.upsert_products(processed_products)
+        print(f"Bulk loaded {len(processed_products)} products")
+        return len(processed_products)
     
+    # Limit dahilindeki ürünler (yazılamayanlar aşağıda sayaçtan düşülür);
+    # aynı sku sayfada tekrar ederse tek tek yazarken olduğu gibi son hali geçerli olur
+    candidates = {}
     for product in products:
-        # Limit kontrolü
-        if not subscription_limits.can_add_product():
+        if not subscription_limits.add_product():
             print(f"Ürün limiti aşıldı. Maksimum: {subscription_limits.product_limit}")
             break
+        product.user = store_data.get('user')
+        sku_key = product_key(STORE_TYPE, store_data['id'], product.sku)
+        if sku_key in candidates:
+            subscription_limits.added_products -= 1
+        candidates[sku_key] = product
 
-        try:
-            products_collection = directus.collection('products')
+    # Daha önce görülmüş ürünlerin id'leri identity cache'ten, kalanlar tek sorguda gelir
+    existing_ids = await identity_cache.get_many('product_sku', list(candidates))
+    learned_ids = {}
+    missing = [product.sku for sku_key, product in candidates.items() if sku_key not in existing_ids]
+    if missing:
+        existing_products = await read(directus.collection('products').filter(
+            F(store=store_data['id']) & F(sku__in=missing)
+        ).fields('id', 'sku').limit(-1).read, 'products')
+        for item in existing_products.items or []:
+            learned_ids.setdefault(product_key(STORE_TYPE, store_data['id'], item['sku']), item['id'])
+        existing_ids.update(learned_ids)
 
-            # Ürünün zaten var olup olmadığını kontrol et
-            existing_product = await products_collection.filter(
-                (F(sku=product['sku']) & F(store=store_data['id']))
-            ).read()
-            
-            # User bilgisini ekle
-            product['user'] = store_data.get('user')
-            
-            if existing_product.items:
-                # Ürün varsa güncelle
-                updated_product = await products_collection.update(existing_product.items[0]['id'], product)
-                processed_products.append(updated_product)
-                subscription_limits.add_product()  # Sadece yeni eklenen ürünler için sayacı artır
-                print(f"Updated product: {product['extra_fields']['productContentId']}")
-            else:
-                # Ürün yoksa ve limit uygunsa yeni ekle
-                created_product = await products_collection.create(product)
-                processed_products.append(created_product)
-                subscription_limits.add_product()  # Sadece yeni eklenen ürünler için sayacı artır
-                print(f"Added new product: {product['extra_fields']['productContentId']}")
-                
-        except Exception as e:
-            print(f"Ürün işlenirken hata oluştu: {str(e)}")
+    updates = [(sku_key, product) for sku_key, product in candidates.items() if sku_key in existing_ids]
+    new_products = [(sku_key, product) for sku_key, product in candidates.items() if sku_key not in existing_ids]
+
+    # Ürün varsa güncelle; istekler write scheduler'ın penceresi kadar eşzamanlı gider
+    results = await write_scheduler.update(
+        directus, 'products', [(existing_ids[sku_key], product) for sku_key, product in updates]
+    )
+    failed_keys = []
+    for (sku_key, product), ok in zip(updates, results):
+        if ok:
+            processed_products.append(product)
+            print(f"Updated product: {product.product_id}")
+        else:
+            # Cache'teki id silinmiş bir ürüne ait olabilir, sonraki sefer yeniden okunur
+            failed_keys.append(sku_key)
+            learned_ids.pop(sku_key, None)
+    await identity_cache.invalidate('product_sku', failed_keys)
+
+    # Ürün yoksa yeni ekle (pencerenin batch boyutunda)
+    created = await write_scheduler.create(directus, 'products', [product for _, product in new_products])
+    for (sku_key, product), item in zip(new_products, created):
+        if item is None:
+            failed_keys.append(sku_key)
             continue
-    
-    return processed_products
+        processed_products.append(product)
+        if item.get('id') is not None:
+            learned_ids[sku_key] = item['id']
+        print(f"Added new product: {product.product_id}")
+
+    subscription_limits.added_products -= len(failed_keys)
+    await identity_cache.set_many('product_sku', learned_ids)
+    return len(processed_products)
 
-async def add_reviews_to_directus(raw_reviews: List[Dict], store_data: Dict, subscription_limits: SubscriptionLimits):
+def transform_reviews_for_directus(raw_reviews: List[Dict], product_ids: Dict[str, Any], store_data: Dict) -> List[ReviewRecord]:
     """
-    Yorumları Directus'a ekler
+    Bir sayfa Trendyol yorumunu Directus formatına dönüştürür.
+    Ağ erişimi yoktur; eşleşen ürünü olmayan yorumlar atlanır.
+    """
+    reviews = [review for review in raw_reviews if str(review['contentId']) in product_ids]
+    extra_fields = extra_fields_for(STORE_TYPE, 'review')
+
+    ratings = [review.get('rate', 0) for review in reviews]
+    review_dates, review_created_dates = epoch_ms_to_dates([review['createdDate'] for review in reviews])
+    review_sentiments = sentiments(ratings)
+    store_id = store_data['id']
+    user = store_data.get('user')
+
+    return [
+        ReviewRecord(
+            review_target_id=f"{STORE_TYPE}_{review['contentId']}",
+            product=product_ids[str(review['contentId'])],
+            content=review.get('comment', ''),
+            rating=rating,
+            review_date=review_date,
+            review_created_date=review_created_date,
+            source=STORE_TYPE,
+            sentiment=sentiment,
+            status="published",
+            store_id=store_id,
+            extra=encode_extra(project(review, extra_fields, exclude=MAPPED_REVIEW_FIELDS)),
+            user=user
+        )
+        for review, rating, review_date, review_created_date, sentiment
+        in zip(reviews, ratings, review_dates, review_created_dates, review_sentiments)
+    ]
+
+async def add_reviews_to_directus(raw_reviews: List[Dict], store_data: Dict, subscription_limits: SubscriptionLimits, product_index: Optional[Dict[str, Any]] = None):
+    """
+    Bir sayfa yorumu Directus'a ekler: önce sayfa için eşlemeleri toplu okur,
+    sonra yorumları toplu dönüştürür, en son yazar.
     """
     directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
-    
-    reviews_collection = directus.collection('reviews')
-    products_collection = directus.collection('products')
-    store_type = STORE_TYPE
-    
-    for review in raw_reviews:
-        try:
-            print("***********************************")
-            print(subscription_limits.can_add_review())
-            # Limit kontrolü
-            if not subscription_limits.can_add_review():
-                print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
-                break
 
-            # review_target_id'yi oluştur
-            review_target_id = f"{store_type}_{review['contentId']}"
-            
-            # Önce bu review'in daha önce eklenip eklenmediğini kontrol et
-            existing_review = await reviews_collection.filter(
-                F(review_target_id=review_target_id)
-            ).read()
-            
-            # Products tablosundan eşleşen ürünü bul
-            matching_product = await products_collection.filter(
-                (F(store_type=store_type) & F(product_id=str(review['contentId'])))
-            ).read()
-            
-            if matching_product.items:
-                product_id = matching_product.items[0]['id']
-                
-                # Review nesnesini hazırla
-                content = review.get('comment', '')
-                rating = review.get('rate', 0)
-                review_date = datetime.fromtimestamp(review['createdDate'] / 1000.0).strftime('%Y-%m-%d')
-                review_created_date = datetime.fromtimestamp(review['createdDate'] / 1000.0).isoformat()
-                
-                # Sentiment hesaplama
-                if rating >= 4:
-                    sentiment = 'positive'
-                elif rating == 3:
-                    sentiment = 'neutral'
-                else:
-                    sentiment = 'negative'
-                    
-                review_data = {
-                    "review_target_id": review_target_id,
-                    "product": product_id,
-                    "content": content,
-                    "rating": rating,
-                    "review_date": review_date,
-                    "review_created_date": review_created_date,
-                    "source": STORE_TYPE,
-                    "sentiment": sentiment,
-                    "status": "published",
-                    "store_id": store_data['id'],
-                    "extra_fields": review,
-                    "user": store_data.get('user')
-                }
-                
-                if existing_review.items:
-                    # Review varsa güncelle
-                    await reviews_collection.update(existing_review.items[0]['id'], review_data)
-                    subscription_limits.add_review()
-                    print(f"Updated review: {review_target_id}")
-                else:
-                    # Review yoksa yeni ekle
-                    await reviews_collection.create(review_data)
-                    print(f"Added new review: {review_target_id}")
-                    subscription_limits.add_review()
+    if not subscription_limits.can_add_review():
+        print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
+        return
+
+    if product_index is not None:
+        product_ids = product_index
+    else:
+        content_ids = list({str(review['contentId']) for review in raw_reviews})
+        product_ids = await fetch_product_ids(directus, STORE_TYPE, store_data['id'], content_ids)
+
+    review_rows = transform_reviews_for_directus(raw_reviews, product_ids, store_data)
+    skipped = len(raw_reviews) - len(review_rows)
+    if skipped:
+        print(f"Warning: No matching product found for {skipped} reviews")
+
+    # review_target_id ürün bazlı olduğu için aynı sayfada tekrarlanabilir;
+    # tek tek yazarken olduğu gibi son yorum geçerli olur
+    rows_by_target = {row.review_target_id: row for row in review_rows}
+    # Toplu yazmada güncelleme ON CONFLICT ile yapılır, mevcut yorumlara bakmaya gerek yok
+    loader = await get_bulk_loader()
+    if loader:
+        existing_ids = {}
+    else:
+        existing_ids = await fetch_existing_review_ids(directus, list(rows_by_target))
+
+    new_rows = []
+    updates = []
+    for review_data in rows_by_target.values():
+        # Limit kontrolü (yazılamayanlar aşağıda sayaçtan düşülür)
+        if not subscription_limits.add_review():
+            print(f"Yorum limiti aşıldı. Maksimum: {subscription_limits.review_limit}")
+            break
+
+        existing_id = existing_ids.get(review_data.review_target_id)
+        if existing_id is not None:
+            updates.append((existing_id, review_data))
+        else:
+            new_rows.append(review_data)
+
+    if updates:
+        # Review varsa güncelle; istekler write scheduler'ın penceresi kadar eşzamanlı gider
+        results = await write_scheduler.update(directus, 'reviews', updates)
+        failed = [review_data.review_target_id for (_, review_data), ok in zip(updates, results) if not ok]
+        subscription_limits.added_reviews -= len(failed)
+        await identity_cache.invalidate('review', failed)
+        print(f"Updated {len(updates) - len(failed)} reviews")
+
+    if new_rows:
+        try:
+            if loader:
+                await loader.upsert_reviews(new_rows)
             else:
-                print(f"Warning: No matching product found for {review_target_id}")
-                
+                # Yeni yorumlar pencerenin batch boyutunda eklenir;
+                # yazılamayanlar dead-letter'a düştü, replay'de eklenecek
+                created = await write_scheduler.create(directus, 'reviews', new_rows)
+                subscription_limits.added_reviews -= created.count(None)
+                await remember_created('review', new_rows, 'review_target_id', created)
+            print(f"Added {len(new_rows)} new reviews")
+        except DirectusUnavailable:
+            raise
         except Exception as e:
-            print(f"Error processing review: {str(e)}")
-            continue
\ No newline at end of file
+            print(f"Error adding reviews: {str(e)}")
+            subscription_limits.added_reviews -= len(new_rows)
@@ -0,0 +1,163 @@
+"""
+Mağaza bazında isteğe bağlı profil çıkarma.
+
+    PROFILE_ALL=1          Tüm mağazalar profillenir
+    PROFILE_STORES=12,34   Sadece bu mağaza id'leri
+    stores.profile_import  Mağaza kaydında true ise o mağaza
+
+pyinstrument kuruluysa örnekleyen profiler kullanılır (HTML flamegraph),
+değilse cProfile (.prof, snakeviz/flameprof ile açılabilir). PROFILER=cprofile
+ile cProfile zorlanabilir. Ayrıca asyncio görevlerinin event loop'ta çalıştığı
+süreler toplanır; wall süresinden kalan kısım I/O (Directus, marketplace) ya da
+uykuda bekleme demektir.
+
+Çıktılar PROFILE_DIR altında: profile_<store_id>_<timestamp>.{html|prof} ve .txt özet.
+"""
+import io
+import os
+import time
+import pstats
+import asyncio
+import cProfile
+import functools
+import contextlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict
+
+PROFILE_ALL = os.getenv("PROFILE_ALL", "0").lower() in ("1", "true", "yes")
+PROFILE_STORES = {store_id.strip() for store_id in os.getenv("PROFILE_STORES", "").split(",") if store_id.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs")
+PROFILER = os.getenv("PROFILER", "auto").lower()
+# Özette gösterilecek en fazla görev / fonksiyon sayısı
+PROFILE_TOP = 30
+
+
+def _pyinstrument_profiler():
+    """pyinstrument sadece profil açıldığında yüklenir; kurulu değilse None"""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # pyinstrument opsiyonel, yoksa cProfile kullanılır
+        return None
+    return Profiler
+
+
+def profiling_enabled(store_data: Dict) -> bool:
+    return PROFILE_ALL or str(store_data.get('id')) in PROFILE_STORES or bool(store_data.get('profile_import'))
+
+
+def _task_label(handle: asyncio.Handle) -> str:
+    callback = handle._callback
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, '__qualname__', None) or owner.get_name()
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+    return getattr(callback, '__qualname__', None) or type(callback).__name__
+
+
+class TaskTimer:
+    """
+    Event loop'un çalıştırdığı her callback'in süresini ait olduğu asyncio
+    görevine (coroutine adına) yazar. Ölçüm süresince asyncio.Handle._run
+    sarmalanır; sadece profil açıkken etkindir.
+    """
+
+    def __init__(self):
+        self.busy: Dict[str, float] = defaultdict(float)
+        self.steps: Dict[str, int] = defaultdict(int)
+        self._original = None
+
+    def __enter__(self) -> 'TaskTimer':
+        self._original = original = asyncio.Handle._run
+        busy, steps = self.busy, self.steps
+
+        def timed_run(handle):
+            started_at = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                label = _task_label(handle)
+                busy[label] += time.perf_counter() - started_at
+                steps[label] += 1
+
+        asyncio.Handle._run = timed_run
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        asyncio.Handle._run = self._original
+
+    def report(self, wall: float) -> str:
+        total_busy = sum(self.busy.values())
+        lines = [
+            f"Wall: {wall:.2f} sn",
+            f"Event loop'ta çalışma: {total_busy:.2f} sn",
+            f"Bekleme (I/O, sleep): {max(0.0, wall - total_busy):.2f} sn",
+            "",
+            f"{'görev':<60} {'süre_sn':>9} {'adım':>8}",
+        ]
+        for label, busy in sorted(self.busy.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP]:
+            lines.append(f"{label[:60]:<60} {busy:>9.3f} {self.steps[label]:>8}")
+        return "\n".join(lines)
+
+
+class StoreProfiler:
+    def __init__(self, store_id: Any):
+        self.store_id = store_id
+        self.base_path = os.path.join(PROFILE_DIR, f"profile_{store_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.profiler_class = _pyinstrument_profiler() if PROFILER != 'cprofile' else None
+        self.use_pyinstrument = self.profiler_class is not None
+        self.timer = TaskTimer()
+        self._profiler = None
+        self._started_at = 0.0
+
+    def __enter__(self) -> 'StoreProfiler':
+        print(f"Profil açık ({self.store_id}): {'pyinstrument' if self.use_pyinstrument else 'cProfile'}")
+        self._profiler = self.profiler_class(async_mode='disabled') if self.use_pyinstrument else cProfile.Profile()
+        self.timer.__enter__()
+        self._started_at = time.perf_counter()
+        if self.use_pyinstrument:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.use_pyinstrument:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        wall = time.perf_counter() - self._started_at
+        self.timer.__exit__(*exc_info)
+        try:
+            self.save(wall)
+        except Exception as e:
+            print(f"Profil kaydedilemedi ({self.store_id}): {str(e)}")
+
+    def save(self, wall: float) -> None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        summary = [f"Mağaza: {self.store_id}", self.timer.report(wall), ""]
+
+        if self.use_pyinstrument:
+            profile_path = f"{self.base_path}.html"
+            with open(profile_path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.output_html())
+            summary.append(self._profiler.output_text(unicode=True, color=False))
+        else:
+            profile_path = f"{self.base_path}.prof"
+            self._profiler.dump_stats(profile_path)
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            summary.append(stream.getvalue())
+
+        with open(f"{self.base_path}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(summary))
+        print(f"Profil yazıldı: {profile_path}, {self.base_path}.txt")
+
+
+def profile_store(store_data: Dict):
+    """Mağaza için profil açıksa profiler'ı, değilse boş bir context döner"""
+    if profiling_enabled(store_data):
+        return StoreProfiler(store_data.get('id'))
+    return contextlib.nullcontext()
@@ -0,0 +1,81 @@
+"""
+Normalize edilmiş ürün ve yorum satırları için kompakt kayıt tipleri.
+
+Dönüştürülen satırlar yazılana kadar bellekte bekler (sayfa, dedupe, write
+scheduler kuyruğu). dict yerine __slots__'lu dataclass kullanılır; extra_fields
+JSON olarak kodlanmış bytes halinde tutulur ve sadece yazılırken çözülür.
+Directus'a/Postgres'e giden dict'ler as_dict() ile batch batch üretilir.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import json_codec
+
+
+class _Unset:
+    """Payload'a hiç yazılmayacak alanların değeri"""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return 'UNSET'
+
+
+UNSET = _Unset()
+
+
+def encode_extra(extra_fields: Dict) -> bytes:
+    return json_codec.dumps(extra_fields)
+
+
+class Record:
+    __slots__ = ()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Directus/Postgres satırı; UNSET alanlar atlanır, extra bytes'ı çözülür"""
+        row = {}
+        # dataclass(slots=True) __slots__'u alan sırasıyla üretir
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is UNSET:
+                continue
+            if name == 'extra':
+                row['extra_fields'] = json_codec.loads(value)
+            else:
+                row[name] = value
+        return row
+
+
+@dataclass(slots=True)
+class ProductRecord(Record):
+    product_id: str
+    sku: str
+    name: str
+    description: str
+    price: float
+    category: str
+    status: str
+    store: Any
+    url: str
+    images: List[str]
+    store_type: str
+    # extra_fields, json_codec ile kodlanmış
+    extra: bytes
+    user: Any = UNSET
+    # Trendyol güncellemede sıralamayı sıfırlar, Hepsiburada hiç göndermez
+    sort: Optional[int] = UNSET
+
+
+@dataclass(slots=True)
+class ReviewRecord(Record):
+    review_target_id: str
+    product: Any
+    content: str
+    rating: float
+    review_date: str
+    review_created_date: str
+    source: str
+    sentiment: str
+    status: str
+    store_id: Any
+    user: Any
+    # extra_fields, json_codec ile kodlanmış
+    extra: bytes
@@ -0,0 +1,84 @@
+"""
+Yorum dönüşümü için saf (ağ erişimi olmayan), sayfa bazlı yardımcılar.
+
+Parser'lar bir sayfadaki tüm yorumları tek seferde dönüştürür; tarih ve
+puan kolonları mümkünse NumPy ile toplu işlenir, yoksa düz Python'a düşülür.
+"""
+import time
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy opsiyonel
+    np = None
+
+# NumPy tarihleri UTC olarak hesaplar; datetime.fromtimestamp ise yerel saati
+# kullanır. Sonuçların aynı olması için vektörel yol sadece UTC'de açılır.
+_LOCAL_TZ_IS_UTC = time.timezone == 0 and not time.daylight
+USE_NUMPY = np is not None and _LOCAL_TZ_IS_UTC
+# Küçük sayfalarda dizi oluşturma maliyeti kazançtan büyük
+NUMPY_MIN_BATCH = 64
+
+# Puanın tamsayı kısmına göre sentiment (0-5)
+SENTIMENT_BY_RATING = ('negative', 'negative', 'negative', 'neutral', 'positive', 'positive')
+
+
+def sentiment_for(rating: float) -> str:
+    if rating >= 4:
+        return 'positive'
+    if rating == 3:
+        return 'neutral'
+    return 'negative'
+
+
+def sentiments(ratings: Sequence[float]) -> List[str]:
+    """Bir sayfa puan için sentiment listesi (>=4 pozitif, 3 nötr, diğerleri negatif)"""
+    if USE_NUMPY and len(ratings) >= NUMPY_MIN_BATCH:
+        values = np.asarray(ratings, dtype=float)
+        buckets = np.where(values >= 4, 2, np.where(values == 3, 1, 0))
+        labels = ('negative', 'neutral', 'positive')
+        return [labels[b] for b in buckets.tolist()]
+
+    result = []
+    for rating in ratings:
+        if rating.__class__ is int and 0 <= rating <= 5:
+            result.append(SENTIMENT_BY_RATING[rating])
+        else:
+            result.append(sentiment_for(rating))
+    return result
+
+
+def epoch_ms_to_dates(timestamps_ms: Sequence[int]) -> Tuple[List[str], List[str]]:
+    """
+    Milisaniye cinsinden zaman damgalarını (review_date, review_created_date)
+    kolonlarına çevirir. Çıktı datetime.fromtimestamp(...).strftime('%Y-%m-%d')
+    ve .isoformat() ile aynıdır; her zaman damgası bir kez dönüştürülür.
+    """
+    if USE_NUMPY and len(timestamps_ms) >= NUMPY_MIN_BATCH:
+        values = np.asarray(timestamps_ms, dtype='int64') * 1000
+        iso = np.datetime_as_string(values.astype('datetime64[us]'), unit='us').tolist()
+        # isoformat() mikro saniye sıfırsa kesir kısmını yazmaz
+        created = [s[:-7] if s.endswith('.000000') else s for s in iso]
+        return [s[:10] for s in created], created
+
+    dates, created = [], []
+    for ts in timestamps_ms:
+        dt = datetime.fromtimestamp(ts / 1000.0)
+        iso = dt.isoformat()
+        dates.append(iso[:10])
+        created.append(iso)
+    return dates, created
+
+
+def iso_strings_to_dates(values: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """
+    '2024-01-02T10:00:00+03:00' biçimindeki tarihleri saat dilimi kısmı
+    atılarak (review_date, review_created_date) kolonlarına çevirir.
+    """
+    dates, created = [], []
+    for value in values:
+        iso = datetime.fromisoformat(value.split('+')[0]).isoformat()
+        dates.append(iso[:10])
+        created.append(iso)
+    return dates, created
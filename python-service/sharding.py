@@ -0,0 +1,84 @@
+"""
+Mağaza import'larının süreçler ve container'lar arasında paylaştırılması.
+
+Her mağaza, anahtarının consistent hash'ine göre tek bir shard'a düşer.
+Shard sayısı değiştiğinde mağazaların yalnızca küçük bir kısmı yer
+değiştirir.
+
+Checkpoint'ler (CHECKPOINT_DIR) ve import istatistikleri (IMPORT_STATS_DIR)
+yerel dosyalardır. Aynı makinedeki süreçler ve replikalar bu dizinleri
+paylaşır (compose'ta ./python-service/state), yer değiştiren mağazanın
+yarıda kalan import'u yeni sahibinde checkpoint'ten devam eder. Replikalar
+farklı makinelerdeyse yeni sahip checkpoint'i göremez: import baştan alınır
+(mevcut kayıtlar güncellenir, çoğalmaz), deneme sayacı ve süre tahmini de
+sıfırdan başlar. Bunu istemeyen kurulumlar bu dizinleri ortak bir diske
+(NFS vb.) almalıdır.
+
+    SHARD_COUNT  Toplam replika sayısı (varsayılan 1)
+    SHARD_INDEX  Bu replikanın sırası, 0..SHARD_COUNT-1
+    SHARD_KEY    upstream (varsayılan) | store | marketplace
+
+upstream anahtarı aynı marketplace mağazasını gösteren mağazaları aynı shard'da
+tutar, böylece fetch cache paylaşımı bozulmaz. main.py --workers N ile her
+replika N sürece bölünürse toplam shard sayısı SHARD_COUNT * N olur.
+"""
+import os
+import bisect
+import hashlib
+from typing import Dict, List
+from fetch_cache import upstream_key
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_KEY = os.getenv("SHARD_KEY", "upstream").lower()
+# Her shard'ın halka üzerindeki sanal düğüm sayısı, dağılımı dengeler
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+def shard_key(store: Dict, mode: str = SHARD_KEY) -> str:
+    if mode == 'marketplace':
+        return (store.get('store_type') or '').lower()
+    if mode == 'upstream':
+        key = upstream_key(store)
+        if key:
+            return ':'.join(key)
+    return f"store:{store['id']}"
+
+
+class HashRing:
+    def __init__(self, shard_count: int, vnodes: int = SHARD_VNODES):
+        self.shard_count = max(1, shard_count)
+        points = sorted(
+            (_hash(f"shard-{shard}-{vnode}"), shard)
+            for shard in range(self.shard_count)
+            for vnode in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        if self.shard_count == 1:
+            return 0
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+class ShardFilter:
+    """Bu sürecin sahip olduğu mağazaları seçer"""
+
+    def __init__(self, shard_index: int = SHARD_INDEX, shard_count: int = SHARD_COUNT, mode: str = SHARD_KEY):
+        if not 0 <= shard_index < max(1, shard_count):
+            raise ValueError(f"SHARD_INDEX {shard_index}, SHARD_COUNT {shard_count} ile uyumsuz")
+        self.shard_index = shard_index
+        self.ring = HashRing(shard_count)
+        self.mode = mode
+
+    def owns(self, store: Dict) -> bool:
+        return self.ring.shard_for(shard_key(store, self.mode)) == self.shard_index
+
+    def select(self, stores: List[Dict]) -> List[Dict]:
+        return [store for store in stores if self.owns(store)]
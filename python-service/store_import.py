@@ -0,0 +1,180 @@
+"""
+Mağaza import'larının çalıştırılması: bekleyen mağazaları okur, zamanlar ve
+her birini kendi marketplace parser'ı ile işler.
+
+main.py işlenecek mağaza olduğunu gördükten sonra yükler; py_directus ve
+parser bağımlılıkları cron'un boş geçen çalışmalarında hiç import edilmez.
+Parser modülleri de sadece o türden bir mağaza işlenirken yüklenir.
+"""
+import os
+import time
+import asyncio
+import importlib
+from py_directus import Directus, F
+
+from checkpoint import ImportCheckpoint, INTERRUPTED_STATUS, failure_status
+from fetch_cache import shared_fetch_cache, upstream_key
+from bulk_loader import close_bulk_loader
+from identity_cache import identity_cache
+from sharding import ShardFilter, SHARD_COUNT, SHARD_INDEX
+from import_stats import StoreStats, schedule_stores
+from directus_lookup import count_items
+from write_scheduler import write_scheduler
+import identity_pool
+from profiling import profile_store
+
+# Bir çalışmada bir shard'ın işleyeceği en fazla mağaza sayısı
+STORES_PER_RUN = 10
+# Zamanlamada değerlendirilen bekleyen mağaza sayısı (shard başına)
+SCHEDULER_CANDIDATES = int(os.getenv("SCHEDULER_CANDIDATES", "200"))
+
+# TODO: Eğer bir mağaza işlemeye başlandıysa o işlem tekrar geldiğinde onu atla
+
+async def process_store(store_data):
+    store_type = store_data.get('store_type', '').lower()
+    try:
+        # Directus bağlantısını oluştur
+        directus_api_url = os.getenv("DIRECTUS_API_URL")
+        directus_api_token = os.getenv("DIRECTUS_API_TOKEN")
+        directus = await Directus(directus_api_url, token=directus_api_token)
+
+        # Mağazanın import durumunu "fetching_store_reviews" olarak güncelle
+        stores_collection = directus.collection('stores')
+        await stores_collection.update(store_data['id'], {
+            'import_status': 'fetching_store_reviews'
+        })
+
+        # Dynamically import the appropriate parser module
+        parser_module = importlib.import_module(f'parsers.{store_type}')
+        
+        print("Parser module: ", store_type)
+        print("Store data: ", store_data)
+        
+        # Call the parse_store function from the parser module
+        started_at = time.monotonic()
+        parse_result = await parser_module.parse_store(store_data)
+        await record_import_stats(directus, store_data, time.monotonic() - started_at, bool(parse_result))
+        
+        if parse_result:
+            await stores_collection.update(store_data['id'], {
+                'import_status': 'store_reviews_fetched'
+            })
+
+    except Exception as e:
+        print(f"Error in process_store: {str(e)}")
+        # Hata durumunda import_status'u "error" olarak güncelle,
+        # checkpoint varsa bir sonraki çalışmada kaldığı yerden devam edilecek
+        stores_collection = directus.collection('stores')
+        await stores_collection.update(store_data['id'], {
+            'import_status': failure_status(store_data['id'])
+        })
+
+async def record_import_stats(directus, store_data, duration: float, finished: bool) -> None:
+    """Zamanlamada kullanılmak üzere import süresini ve mağazadaki kayıt sayılarını saklar"""
+    stats = StoreStats.load(store_data['id'])
+    try:
+        products = await count_items(directus, 'products', F(store=store_data['id']))
+        reviews = await count_items(directus, 'reviews', F(store_id=store_data['id']))
+    except Exception as e:
+        print(f"Kayıt sayıları alınamadı ({store_data['id']}): {str(e)}")
+        products = reviews = None
+    stats.record_run(duration, finished, products, reviews)
+    stats.save()
+    print(f"Import süresi ({store_data['id']}): {duration:.1f} sn, {products} ürün, {reviews} yorum")
+
+async def recover_stalled_stores(directus, shard: ShardFilter) -> None:
+    """
+    İşlenirken süreci ölen (timeout, container restart) mağazaları bulur.
+    Checkpoint'i (ya da checkpoint yoksa mağaza kaydı) uzun süredir güncellenmeyen
+    mağazalar başarısız deneme sayılır ve import_interrupted'a alınır; bekleme
+    süresi dolunca kaldıkları yerden devam ederler.
+    """
+    stores = await directus.collection('stores') \
+        .filter(F(import_status='fetching_store_reviews')) \
+        .read()
+
+    for store in shard.select(stores.items or []):
+        if not ImportCheckpoint.is_stale(store['id'], updated_at=store.get('date_updated') or store.get('date_created')):
+            continue
+        print(f"Yarıda kalmış import bulundu: {store['id']}")
+        # Her seferinde ölen import (ör. bellek yetmiyor) sonsuza kadar denenmesin
+        retry = ImportCheckpoint.load(store['id'], quiet=True).record_failure()
+        await directus.collection('stores').update(store['id'], {
+            'import_status': INTERRUPTED_STATUS if retry else 'error'
+        })
+
+def group_by_upstream(stores):
+    """
+    Aynı marketplace mağazasını gösteren mağazaları yan yana dizer ve
+    fetch cache'e bildirir; upstream veri bir kez çekilip hepsine dağıtılır.
+    """
+    groups = {}
+    for store in stores:
+        key = upstream_key(store) or ('store', str(store['id']))
+        groups.setdefault(key, []).append(store)
+
+    ordered = []
+    for (marketplace, upstream_id), group in groups.items():
+        if len(group) > 1:
+            print(f"{marketplace} {upstream_id} için {len(group)} mağaza aynı veriyi paylaşacak: {[s['id'] for s in group]}")
+        shared_fetch_cache.register(marketplace, upstream_id, len(group))
+        ordered.extend(group)
+    return ordered
+
+async def fetch_store_data(shard_index: int = SHARD_INDEX, shard_count: int = SHARD_COUNT):
+    try:
+        shard = ShardFilter(shard_index, shard_count)
+        directus = await Directus(os.getenv("DIRECTUS_API_URL"), token=os.getenv("DIRECTUS_API_TOKEN"))
+        # Her shard kendi payına düşenleri seçeceği için aday sayısı shard sayısıyla artar.
+        # Pencerenin yarısı en uzun bekleyen (en eski), yarısı en son gelen mağazalar;
+        # kuyruk pencereden uzunken de yeni mağazalar zamanlayıcıya ulaşır
+        window = SCHEDULER_CANDIDATES * shard_count
+        pending = F(import_status='product_info_not_fetched') | F(import_status=INTERRUPTED_STATUS)
+        oldest_stores = directus.collection('stores').filter(pending).sort('id').limit(window - window // 2)
+        newest_stores = directus.collection('stores').filter(pending).sort('id', asc=False).limit(window // 2)
+        
+        #.filter(F(id='79')) \
+
+        await recover_stalled_stores(directus, shard)
+
+        print("Getting stores...")
+        stores = {}
+        for response in (await oldest_stores.read(), await newest_stores.read()):
+            for store in response.items or []:
+                stores.setdefault(store['id'], store)
+        # Yarıda kalanlar bekleme süreleri dolunca tekrar denenir
+        candidates = [
+            store for store in shard.select(list(stores.values()))
+            if store.get('import_status') != INTERRUPTED_STATUS or ImportCheckpoint.retry_due(store['id'])
+        ]
+        # Küçük/yeni mağazalar önce, bekleyenler yaşlandıkça öne geçer, kullanıcılar arasında sırayla
+        store_items = schedule_stores(candidates, STORES_PER_RUN)
+        
+        if not store_items:
+            print("Hiç mağaza bulunamadı.")
+            return
+        
+        if shard_count > 1:
+            print(f"Shard {shard_index + 1}/{shard_count}: {len(store_items)} mağaza bulundu.")
+        else:
+            print(f"Toplam {len(store_items)} mağaza bulundu.")
+
+        store_items = group_by_upstream(store_items)
+
+        # Process each store
+        for store in store_items:
+            # PROFILE_ALL / PROFILE_STORES veya mağazadaki profile_import ile profil çıkarılır
+            with profile_store(store):
+                await process_store(store)
+
+    except Exception as e:
+        print(f"Error in fetch_store_data: {str(e)}")
+    finally:
+        shared_fetch_cache.close()
+        await close_bulk_loader()
+        await identity_cache.close()
+        write_scheduler.summary()
+        identity_pool.summary()
+
+def run_worker(shard_index: int, shard_count: int) -> None:
+    asyncio.run(fetch_store_data(shard_index, shard_count))
@@ -0,0 +1,115 @@
+"""
+bulk_loader için Postgres entegrasyon testi.
+
+Gerçek bir Postgres gerektirir, BULK_LOAD_TEST_DSN verilmezse atlanır:
+    BULK_LOAD_TEST_DSN=postgresql://postgres:1@localhost:5432/postgres python -m pytest tests/test_bulk_loader.py
+
+Testler geçici bir şemada Directus tablolarının küçük bir kopyasını oluşturur
+ve sonunda şemayı siler; Directus'un tablolarına dokunulmaz.
+"""
+import os
+import asyncio
+import pytest
+
+import bulk_loader
+from bulk_loader import BulkLoader
+from records import ProductRecord, ReviewRecord, encode_extra
+
+TEST_DSN = os.getenv("BULK_LOAD_TEST_DSN")
+SCHEMA = "bulk_load_test"
+
+pytestmark = pytest.mark.skipif(
+    bulk_loader.asyncpg is None or not TEST_DSN,
+    reason="asyncpg ve BULK_LOAD_TEST_DSN gerekli"
+)
+
+TABLES = """
+CREATE TABLE products (
+    id serial PRIMARY KEY, store integer, sku varchar(255), product_id varchar(255), name varchar(255),
+    description text, price numeric, category varchar(255), status varchar(255), url text,
+    images text, store_type varchar(255), extra_fields json, "user" uuid, sort integer,
+    date_created timestamptz, date_updated timestamptz
+);
+CREATE TABLE reviews (
+    id serial PRIMARY KEY, review_target_id varchar(255), product integer, content text, rating numeric,
+    review_date date, review_created_date timestamp, source varchar(255), sentiment varchar(255),
+    status varchar(255), store_id integer, "user" uuid, extra_fields json,
+    date_created timestamptz, date_updated timestamptz
+);
+"""
+USER = '00000000-0000-0000-0000-000000000001'
+
+
+def _schema_dsn() -> str:
+    # asyncpg DSN'deki bilinmeyen parametreleri sunucu ayarı olarak gönderir
+    return f"{TEST_DSN}{'&' if '?' in TEST_DSN else '?'}search_path={SCHEMA}"
+
+
+def product(sku: str, price: float) -> ProductRecord:
+    return ProductRecord(
+        product_id=f"p-{sku}", sku=sku, name=f"Ürün {sku}", description='', price=price, category='Test',
+        status='published', store=1, url='', images=['a.jpg', 'b.jpg'], store_type='trendyol',
+        extra=encode_extra({'brand': 'Marka'}), user=USER, sort=None
+    )
+
+
+def review(target: str, content: str) -> ReviewRecord:
+    return ReviewRecord(
+        review_target_id=target, product=1, content=content, rating=5, review_date='2024-01-02',
+        review_created_date='2024-01-02T10:00:00', source='trendyol', sentiment='positive',
+        status='published', store_id=1, user=USER, extra=encode_extra({'trusted': True})
+    )
+
+
+def run(test):
+    async def wrapper():
+        admin = await bulk_loader.asyncpg.connect(TEST_DSN)
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        await admin.execute(f"SET search_path = {SCHEMA}; {TABLES}")
+        try:
+            await test(admin)
+        finally:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            await admin.close()
+    asyncio.run(wrapper())
+
+
+def test_missing_index_is_not_created_by_default():
+    async def test(admin):
+        loader = BulkLoader(_schema_dsn(), create_indexes=False)
+        await loader.connect()
+        try:
+            with pytest.raises(RuntimeError):
+                await loader.ensure_conflict_index('products')
+        finally:
+            await loader.conn.close()
+        indexes = await admin.fetchval(
+            "SELECT count(*) FROM pg_indexes WHERE schemaname = $1 AND indexname LIKE '%bulk_load_key'", SCHEMA
+        )
+        assert indexes == 0
+    run(test)
+
+
+def test_upsert_inserts_then_updates_on_conflict_key():
+    async def test(admin):
+        loader = BulkLoader(_schema_dsn(), create_indexes=True)
+        await loader.connect()
+        try:
+            ids = await loader.upsert_products([product('A', 10), product('B', 20)])
+            updated = await loader.upsert_products([product('A', 15)])
+            assert updated == {'A': ids['A']}
+
+            assert await loader.upsert_reviews([review('trendyol_1', 'iyi'), review('trendyol_1', 'çok iyi')]) == 1
+            assert await loader.upsert_reviews([review('trendyol_1', 'harika')]) == 1
+        finally:
+            await loader.conn.close()
+
+        rows = await admin.fetch(f"SELECT sku, price, images, extra_fields::text AS extra, date_updated FROM {SCHEMA}.products ORDER BY sku")
+        assert [(row['sku'], float(row['price'])) for row in rows] == [('A', 15.0), ('B', 20.0)]
+        assert rows[0]['images'] == 'a.jpg,b.jpg'
+        assert '"brand"' in rows[0]['extra']
+        assert rows[0]['date_updated'] is not None
+
+        contents = await admin.fetch(f"SELECT content FROM {SCHEMA}.reviews")
+        assert [row['content'] for row in contents] == ['harika']
+    run(test)
@@ -0,0 +1,171 @@
+"""
+products ve reviews yazmaları için uyarlanabilir batch boyutu ve eşzamanlılık.
+
+Her koleksiyonun bir penceresi vardır: batch boyutu ve aynı anda uçuşta
+olabilecek istek sayısı. AIMD ile ayarlanır:
+    - istek WRITE_TARGET_LATENCY içinde başarılıysa batch boyutu WRITE_BATCH_STEP
+      kadar, eşzamanlılık her tam pencerede 1 artar (toplamsal artış)
+    - istek hata verirse ya da hedef süreyi aşarsa ikisi de yarıya iner
+      (çarpımsal azalış, gecikme süresi içinde en fazla bir kez)
+Böylece küçük mağazada da büyük mağazada da Directus/Postgres'in kaldırabildiği
+en yüksek yazma hızına yaklaşılır. Güncel pencere metrics'e yazılır.
+"""
+import os
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from py_directus import Directus
+from directus_writer import create_rows, update_item
+from records import Record
+import metrics
+
+WRITE_BATCH_INITIAL = int(os.getenv("WRITE_BATCH_INITIAL", "50"))
+WRITE_BATCH_MIN = int(os.getenv("WRITE_BATCH_MIN", "10"))
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "1000"))
+WRITE_BATCH_STEP = int(os.getenv("WRITE_BATCH_STEP", "25"))
+WRITE_IN_FLIGHT_MAX = int(os.getenv("WRITE_IN_FLIGHT_MAX", "8"))
+# Bir yazma isteğinin (batch dahil) hedef süresi, aşılırsa pencere küçülür
+WRITE_TARGET_LATENCY = float(os.getenv("WRITE_TARGET_LATENCY", "2"))
+DECREASE_FACTOR = 0.5
+# Gecikme ve hata oranı ortalamalarında yeni ölçümün ağırlığı
+SMOOTHING = 0.2
+
+
+class AdaptiveWindow:
+    def __init__(self, collection: str, initial_batch: int = WRITE_BATCH_INITIAL, min_batch: int = WRITE_BATCH_MIN,
+                 max_batch: int = WRITE_BATCH_MAX, max_in_flight: int = WRITE_IN_FLIGHT_MAX,
+                 target_latency: float = WRITE_TARGET_LATENCY):
+        self.collection = collection
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.target_latency = target_latency
+        self.batch_size = float(max(min_batch, min(initial_batch, max_batch)))
+        self.in_flight_limit = 1.0
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self._decreased_at = 0.0
+        self._slots = asyncio.Condition()
+
+    @property
+    def batch(self) -> int:
+        return int(self.batch_size)
+
+    async def acquire(self) -> None:
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.in_flight_limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    def observe(self, latency: float, ok: bool) -> None:
+        """directus_writer her deneme sonrası çağırır"""
+        self.latency = latency if self.latency is None else SMOOTHING * latency + (1 - SMOOTHING) * self.latency
+        self.error_rate = SMOOTHING * (0.0 if ok else 1.0) + (1 - SMOOTHING) * self.error_rate
+
+        if ok and latency <= self.target_latency:
+            self.batch_size = min(self.max_batch, self.batch_size + WRITE_BATCH_STEP)
+            self.in_flight_limit = min(self.max_in_flight, self.in_flight_limit + 1 / self.in_flight_limit)
+        else:
+            now = time.monotonic()
+            # Aynı yük anında dönen istekler pencereyi art arda küçültmesin
+            if now - self._decreased_at >= (self.latency or self.target_latency):
+                self._decreased_at = now
+                self.batch_size = max(self.min_batch, self.batch_size * DECREASE_FACTOR)
+                self.in_flight_limit = max(1.0, self.in_flight_limit * DECREASE_FACTOR)
+                print(f"{self.collection} yazma penceresi küçültüldü: batch {self.batch}, "
+                      f"eşzamanlı {int(self.in_flight_limit)} ({'hata' if not ok else f'{latency:.1f} sn'})")
+        self.publish()
+
+    def publish(self) -> None:
+        metrics.set_gauge('write_batch_size', self.batch, collection=self.collection)
+        metrics.set_gauge('write_in_flight_limit', int(self.in_flight_limit), collection=self.collection)
+        metrics.set_gauge('write_latency_seconds', round(self.latency or 0.0, 3), collection=self.collection)
+        metrics.set_gauge('write_error_rate', round(self.error_rate, 3), collection=self.collection)
+
+
+class WriteScheduler:
+    def __init__(self):
+        self.windows: Dict[str, AdaptiveWindow] = {}
+
+    def window(self, collection: str) -> AdaptiveWindow:
+        if collection not in self.windows:
+            self.windows[collection] = AdaptiveWindow(collection)
+        return self.windows[collection]
+
+    async def _run(self, window: AdaptiveWindow, jobs) -> None:
+        """İşleri pencere izin verdikçe başlatır; bir iş hata fırlatırsa kalanlar iptal edilir"""
+        tasks = []
+
+        async def run(job):
+            try:
+                await job()
+            finally:
+                await window.release()
+
+        try:
+            for job in jobs:
+                await window.acquire()
+                tasks.append(asyncio.create_task(run(job)))
+                failed = next((task for task in tasks if task.done() and task.exception()), None)
+                if failed:
+                    raise failed.exception()
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def create(self, directus: Directus, collection: str, rows: List[Record]) -> List[Optional[Dict]]:
+        """
+        Kayıtları pencerenin batch boyutunda bölüp eşzamanlı yazar. Gönderim
+        sırasıyla oluşan kayıtları döner, yazılamayanların yerinde None olur.
+        Kayıtlar dict'e sadece gönderilecekleri batch için çevrilir.
+        """
+        window = self.window(collection)
+        created: List[Optional[Dict]] = [None] * len(rows)
+
+        def jobs():
+            start = 0
+            while start < len(rows):
+                # Batch boyutu her gönderimde pencerenin o anki değerinden alınır
+                end = start + window.batch
+
+                async def job(start=start, end=end):
+                    batch = [row.as_dict() for row in rows[start:end]]
+                    created[start:end] = await create_rows(directus, collection, batch, window.observe)
+                yield job
+                start = end
+
+        await self._run(window, jobs())
+        metrics.inc('items_written', len(rows) - created.count(None), collection=collection)
+        return created
+
+    async def update(self, directus: Directus, collection: str, updates: List[Tuple[Any, Record]]) -> List[bool]:
+        """(id, veri) çiftlerini eşzamanlı günceller, her biri için başarılı olup olmadığını döner"""
+        window = self.window(collection)
+        results = [False] * len(updates)
+
+        def jobs():
+            for index, (item_id, data) in enumerate(updates):
+                async def job(index=index, item_id=item_id, data=data):
+                    results[index] = await update_item(directus, collection, item_id, data.as_dict(), window.observe) is not None
+                yield job
+
+        await self._run(window, jobs())
+        metrics.inc('items_written', sum(results), collection=collection)
+        return results
+
+    def summary(self) -> None:
+        for window in self.windows.values():
+            print(f"{window.collection} yazma penceresi: batch {window.batch}, eşzamanlı {int(window.in_flight_limit)}, "
+                  f"ortalama {window.latency or 0:.2f} sn, hata oranı {window.error_rate:.2f}")
+        metrics.flush(force=True)
+
+
+write_scheduler = WriteScheduler()